@@ -1,15 +1,32 @@
 # save this file as binaryheart_dataset_builder.py
 import requests, os, time, random, json
+import hashlib
+import gzip
+import heapq
+import math
 import sys
+import asyncio
+import socket
+import signal
+import cProfile
+import pstats
+import logging
+import logging.handlers
+import threading
+import queue
+import zlib
+import bisect
+from array import array
 from trafilatura import fetch_url, extract
 from tqdm import tqdm
 from urllib.parse import urljoin, urlparse
 from bs4 import BeautifulSoup
-from collections import deque
+from collections import deque, namedtuple, OrderedDict, Counter
+from functools import lru_cache
 import re
 import io
 from datetime import datetime
-from threading import Lock
+from threading import Lock, Thread
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
@@ -42,12 +59,83 @@ except ImportError:
     OCR_SUPPORT = False
     # Silent fail - OCR will be skipped if not available
 
+# Optional HTTP/2 transport (pip install "httpx[http2]")
+try:
+    import httpx  # type: ignore
+    import h2  # type: ignore
+    HTTP2_SUPPORT = True
+except ImportError:
+    HTTP2_SUPPORT = False
+
+# Optional fast JSON serializer for the record writer (pip install orjson)
+try:
+    import orjson  # type: ignore
+    ORJSON_SUPPORT = True
+except ImportError:
+    ORJSON_SUPPORT = False
+
+# Optional SQLite query index over the dataset (dataset_index.py next to this script)
+try:
+    from dataset_index import DatasetIndex
+    INDEX_SUPPORT = True
+except ImportError:
+    INDEX_SUPPORT = False
+
+# Only advertise encodings urllib3 can actually decode (br/zstd depend on its version and extras)
+try:
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = "gzip,deflate"
+
 # Configuration
 MAX_DOCUMENTS = 25000
 MIN_TEXT_LENGTH = 100
 SAVE_INTERVAL = 100  # Save progress every N documents
+WRITE_QUEUE_SIZE = 2000  # Records waiting for the writer thread before the crawl blocks
+WRITE_BATCH_SIZE = 200  # Records per group commit
+WRITE_FLUSH_INTERVAL = 2.0  # Max seconds a record waits in the writer before being committed
+WRITE_FSYNC = "none"  # "none", "batch" (fsync every group commit) or "close" (once at the end)
 DELAY_MIN = 0.3  # Reduced from 1.5 for faster scraping
 DELAY_MAX = 0.8  # Reduced from 3.0 for faster scraping
+FRONTIER_HOT_SIZE = 10000  # URLs kept in memory; overflow spills to disk instead of being dropped
+FRONTIER_SEGMENT_SIZE = 5000  # URLs per spilled segment file
+MAX_LINKS_PER_PAGE = 50  # Links enqueued per page
+RECRAWL_MODE = "--recrawl" in sys.argv  # Refresh already-collected pages instead of discovering new ones
+RECRAWL_BUDGET = 2000  # Max pages fetched per recrawl run
+RECRAWL_DEFAULT_CHANGE_RATE = 1 / (30 * 86400)  # Assumed changes/second for pages fetched only once
+HTTP_BACKEND = "requests"  # "requests" (default) or "http2" (multiplexed async client, needs httpx[http2])
+PREFETCH_DEPTH = 8  # Upcoming frontier URLs fetched concurrently by the http2 backend
+DNS_CACHE_TTL = 300  # Seconds to cache DNS lookups in-process
+RETRY_MAX_ATTEMPTS = 4  # Fetch attempts before a URL goes to the dead-letter log
+RETRY_BASE_DELAY = 5.0  # Seconds before the first retry (doubles each attempt)
+RETRY_MAX_DELAY = 600.0  # Cap on the retry delay
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}  # Transient HTTP errors worth retrying
+PROFILE_CHECK_INTERVAL = 2.0  # Seconds between checks of the profiling control file
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stack samples in "sample" mode
+SLOW_PAGE_PERCENTILE = 99.9  # Pages slower than this percentile are written to the slow-page log
+SLOW_PAGE_MIN_SAMPLES = 1000  # Pages timed before the slow-page threshold is trusted
+FOCUSED_CRAWL = True  # Order the frontier by the online link-yield model instead of pattern priority alone
+LINK_MODEL_BITS = 18  # Hashed feature space size (2**bits weights)
+LINK_MODEL_LEARNING_RATE = 0.05
+BUILD_INDEX = False  # Keep a SQLite/FTS5 index of the dataset updated as records are saved
+TOKENIZER = "regex"  # Token counts: "regex" (fast approximation), "tiktoken:<encoding>" or "hf:<tokenizer.json path>"
+TOKEN_BUCKETS = [128, 256, 512, 1024, 2048, 4096]  # Upper bounds of the length buckets (tokens)
+WRITE_LENGTH_SHARDS = False  # Also write the final dataset as one JSONL shard per length bucket
+PREFILTER_ENABLED = True  # Reject non-target pages from headers/markup before trafilatura extraction
+PREFILTER_HEAD_CHARS = 8192  # Chars of HTML inspected for lang/title/meta signals
+PREFILTER_DENSITY_CHARS = 65536  # Chars of <body> used for the link-to-text density check
+PREFILTER_LANGUAGES = ("en",)  # Accepted <html lang> / Content-Language prefixes
+PREFILTER_MAX_LINK_DENSITY = 0.7  # Max share of visible text inside links (listing/index pages)
+PREFILTER_LOGIN_MAX_TEXT = 300  # Non-link chars outside a password form below which the page is a login page
+PREFILTER_TITLE_MAX_CHARS = 80  # Longer titles are articles, never utility pages
+# Whole utility-page titles, optionally followed by a site name ("Sign In | HP Community"). Titles that merely
+# mention the topic ("Can't sign in to Windows 11", "Fix login problems") must not match.
+PREFILTER_TITLE_PATTERNS = [
+    r"^\s*(?:sign|log)[\s-]?in(?:\s+to\s+(?:your\s+)?(?:account|community|forums?))?\s*(?:$|[|:·•&\u2013\u2014-])",
+    r"^\s*search results?\b",
+    r"^\s*site ?map\s*(?:$|[|:·•&\u2013\u2014-])",
+    r"^\s*access denied\s*(?:$|[|:·•&\u2013\u2014-])",
+]
 
 # Allowed domains (only crawl these domains)
 ALLOWED_DOMAINS = [
@@ -95,6 +183,16 @@ SKIP_PATTERNS = [
     r"#",  # Skip anchors
 ]
 
+# Per-domain overrides, matched on host suffix (most specific domain wins)
+#   "allow": False blocks the domain, True allows it even if not in ALLOWED_DOMAINS
+#   "deny": extra URL patterns to skip on this domain
+#   "priority": added to the URL's priority score
+#   "max_depth": max number of URL path segments to crawl
+# Example: "dell.com": {"deny": [r"/shop/"], "max_depth": 6}
+DOMAIN_RULES = {}
+
+URL_DECISION_CACHE_SIZE = 65536  # Cached allow/skip/priority decisions (LRU)
+
 # Seed URLs to start crawling from
 # Strategy: Use "hub" pages (directories, categories, indexes) that link to many other pages
 # You only need 20-50 good seed URLs, not 25,000! The crawler will discover links automatically.
@@ -167,17 +265,627 @@ else:
     BASE_DIR = SCRIPT_DIR
 
 progress_file = os.path.join(BASE_DIR, "data/exports/crawler_progress.json")  # Crawler state (for resuming)
+frontier_dir = os.path.join(BASE_DIR, "data/frontier")  # Spilled frontier segments
+recrawl_state_file = os.path.join(BASE_DIR, "data/exports/recrawl_state.json")  # Per-URL fetch history
+dead_letter_file = os.path.join(BASE_DIR, "data/exports/dead_letter.jsonl")  # URLs that failed every retry
+profile_dir = os.path.join(BASE_DIR, "data/exports/profiles")  # Profiler dumps
+# Create this file to start profiling a running crawl, delete it to stop and dump stats.
+# Its content picks the mode: "cprofile" (default) or "sample". SIGUSR1 toggles cProfile too.
+profile_control_file = os.path.join(BASE_DIR, "data/exports/profile.flag")
+slow_page_log = os.path.join(BASE_DIR, "data/exports/slow_pages.log")  # Rotating log of outlier pages
+link_model_file = os.path.join(BASE_DIR, "data/exports/link_model.bin")  # Link-yield model weights
+redirect_map_file = os.path.join(BASE_DIR, "data/exports/redirects.json")  # Redirect hop -> final URL
+index_file = os.path.join(BASE_DIR, "data/exports/dataset.sqlite")  # Query index (BUILD_INDEX)
+shards_dir = os.path.join(BASE_DIR, "data/exports/shards")  # Length-bucketed shards (WRITE_LENGTH_SHARDS)
 output_file = os.path.join(BASE_DIR, "data/exports/dataset.jsonl")  # Main dataset (JSONL format: one JSON object per line)
 
 # Create data directories in the correct location
 os.makedirs(os.path.join(BASE_DIR, "data/raw"), exist_ok=True)
 os.makedirs(os.path.join(BASE_DIR, "data/exports"), exist_ok=True)
+os.makedirs(frontier_dir, exist_ok=True)
+
+class SpillFrontier:
+    """URL frontier with a bounded in-memory window that spills overflow to disk
+    
+    The hot window is a heap ordered by priority (FIFO within equal priority). Once it is
+    full, new URLs collect in an overflow buffer that is written out as sorted, gzipped
+    segments. As the hot window drains, segments are read back best head priority first
+    (oldest first among equals), so a high-priority link found late is not stuck behind
+    every earlier spill.
+    """
+    
+    def __init__(self, spill_dir, hot_size=10000, segment_size=5000, skip=None):
+        self.spill_dir = spill_dir
+        self.hot_size = hot_size
+        self.segment_size = min(segment_size, hot_size)
+        self.skip = skip  # Callable: URLs for which it returns True are dropped on refill
+        self.hot = []  # Heap of (-priority, seq, url)
+        self.hot_urls = set()
+        self.overflow = {}  # url -> priority, waiting to be spilled (insertion order = FIFO)
+        self.segments = []  # (path, count, top priority), oldest first
+        self.spilled_count = 0
+        self.seq = 0
+        self.queued = set()  # 64-bit digests of every queued URL, spilled ones included
+    
+    def __len__(self):
+        return len(self.hot) + len(self.overflow) + self.spilled_count
+    
+    def __contains__(self, url):
+        return self._key(url) in self.queued
+    
+    @staticmethod
+    def _key(url):
+        return int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "big")
+    
+    def push(self, url, priority=0):
+        """Add a URL; returns False if it is already queued (in memory or spilled)"""
+        key = self._key(url)
+        if key in self.queued:
+            return False
+        self.queued.add(key)
+        backlog = self.segments or self.overflow
+        # Keep FIFO order behind spilled URLs, except priority URLs which go straight in
+        if len(self.hot) < self.hot_size and (priority > 0 or not backlog):
+            self._push_hot(url, priority)
+        else:
+            self.overflow[url] = priority
+            if len(self.overflow) >= self.segment_size:
+                self.spill()
+        return True
+    
+    def pop(self):
+        """Remove and return the highest priority URL"""
+        if len(self.hot) <= self.hot_size // 4:
+            self.refill()
+        if not self.hot:
+            raise IndexError("pop from empty frontier")
+        _, _, url = heapq.heappop(self.hot)
+        self.hot_urls.discard(url)
+        self.queued.discard(self._key(url))
+        return url
+    
+    def peek(self, n):
+        """The next n URLs in pop order (hot window only)"""
+        return [url for _, _, url in heapq.nsmallest(n, self.hot)]
+    
+    def _push_hot(self, url, priority):
+        heapq.heappush(self.hot, (-priority, self.seq, url))
+        self.hot_urls.add(url)
+        self.seq += 1
+    
+    def spill(self):
+        """Write the overflow buffer to a sorted, compressed segment file"""
+        if not self.overflow:
+            return
+        # Stable sort: insertion (FIFO) order is kept within a priority
+        entries = sorted(self.overflow.items(), key=lambda item: -item[1])
+        path = os.path.join(self.spill_dir, f"segment-{time.time_ns()}.txt.gz")
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=3) as f:
+            for url, priority in entries:
+                f.write(f"{priority}\t{url}\n")
+        self.segments.append((path, len(entries), entries[0][1]))
+        self.spilled_count += len(entries)
+        self.overflow.clear()
+    
+    def refill(self):
+        """Move spilled segments back into the hot window, best head priority first"""
+        if self.overflow and self.segments:
+            self.spill()  # Let the overflow compete with the segments on priority
+        while self.segments:
+            best = min(range(len(self.segments)), key=lambda i: (-self.segments[i][2], i))
+            path, count, _ = self.segments[best]
+            if self.hot and len(self.hot) + count > self.hot_size:
+                break
+            del self.segments[best]
+            self.spilled_count -= count
+            try:
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        priority, _, url = line.rstrip("\n").partition("\t")
+                        self._refill_url(url, float(priority))
+                os.remove(path)
+            except (OSError, ValueError):
+                continue
+        if not self.segments and self.overflow:
+            room = self.hot_size - len(self.hot)
+            for url, priority in sorted(self.overflow.items(), key=lambda item: -item[1])[:room]:
+                del self.overflow[url]
+                self._refill_url(url, priority)
+    
+    def _track_segment(self, path):
+        """Add a restored segment's URLs to the membership set"""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    self.queued.add(self._key(line.rstrip("\n").partition("\t")[2]))
+        except OSError:
+            pass
+    
+    @staticmethod
+    def _segment_top(path):
+        """Priority of a segment's first (best) entry"""
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return float(f.readline().partition("\t")[0])
+        except (OSError, ValueError):
+            return 0.0
+    
+    def _refill_url(self, url, priority):
+        if url in self.hot_urls:
+            return
+        if self.skip and self.skip(url):
+            self.queued.discard(self._key(url))
+            return
+        self._push_hot(url, priority)
+    
+    def state(self):
+        """Serializable frontier state for the progress file"""
+        in_memory = [[url, -neg_priority] for neg_priority, _, url in sorted(self.hot)]
+        in_memory.extend([url, priority] for url, priority in self.overflow.items())
+        return {"url_queue": in_memory, "frontier_segments": [list(seg) for seg in self.segments]}
+    
+    def restore(self, queued, segments):
+        """Load state saved by state() (plain URL strings from older progress files are accepted)"""
+        for segment in segments:
+            path, count = segment[0], segment[1]
+            if os.path.exists(path):
+                # Progress files from before segment priorities were saved only store (path, count)
+                top = segment[2] if len(segment) > 2 else self._segment_top(path)
+                self.segments.append((path, count, top))
+                self.spilled_count += count
+                self._track_segment(path)
+        for item in queued:
+            url, priority = (item, 0) if isinstance(item, str) else item
+            key = self._key(url)
+            if key in self.queued:
+                continue
+            self.queued.add(key)
+            if len(self.hot) < self.hot_size:
+                self._push_hot(url, priority)
+            else:
+                self.overflow[url] = priority
+    
+    def clear_spill_dir(self):
+        """Remove segment files left by a previous run"""
+        for name in os.listdir(self.spill_dir):
+            if name.startswith("segment-"):
+                os.remove(os.path.join(self.spill_dir, name))
+
+class RecrawlScheduler:
+    """Per-URL fetch history used to schedule revisits by expected freshness gain
+    
+    Each URL keeps its first/last fetch time, content hash, number of fetches and number
+    of observed changes. The change rate is estimated with the Poisson estimator
+    -ln((n - X + 0.5) / (n + 0.5)) / mean_interval, and the freshness gain of a revisit is
+    the probability that the page changed since its last fetch.
+    """
+    
+    def __init__(self, state_file, default_rate=RECRAWL_DEFAULT_CHANGE_RATE):
+        self.state_file = state_file
+        self.default_rate = default_rate
+        self.pages = {}
+        if os.path.exists(state_file):
+            try:
+                with open(state_file, "r", encoding="utf-8") as f:
+                    self.pages = json.load(f)
+            except (OSError, ValueError):
+                self.pages = {}
+    
+    def record_fetch(self, url, digest, now=None):
+        """Record a fetch of url with the given content hash; returns the previous hash"""
+        now = time.time() if now is None else now
+        page = self.pages.get(url)
+        if page is None:
+            self.pages[url] = {"first_fetch": now, "last_fetch": now, "hash": digest,
+                               "fetches": 1, "changes": 0, "has_records": False}
+            return None
+        previous = page["hash"]
+        page["fetches"] += 1
+        if digest != previous:
+            page["changes"] += 1
+            page["hash"] = digest
+        page["last_fetch"] = now
+        return previous
+    
+    def record_yield(self, url, has_records):
+        """Remember whether the page produced dataset records (only those are recrawled)"""
+        if url in self.pages:
+            self.pages[url]["has_records"] = bool(has_records)
+    
+    def change_rate(self, page):
+        """Estimated changes per second"""
+        intervals = page["fetches"] - 1
+        elapsed = page["last_fetch"] - page["first_fetch"]
+        if intervals <= 0 or elapsed <= 0:
+            return self.default_rate
+        changes = min(page["changes"], intervals)
+        rate = -math.log((intervals - changes + 0.5) / (intervals + 0.5)) / (elapsed / intervals)
+        # Floor so pages never seen changing are still revisited eventually
+        return max(rate, self.default_rate / (intervals + 1))
+    
+    def freshness_gain(self, page, now):
+        """Probability the page changed since it was last fetched"""
+        return 1.0 - math.exp(-self.change_rate(page) * max(now - page["last_fetch"], 0.0))
+    
+    def schedule(self, budget, now=None):
+        """Return up to `budget` (url, gain) pairs with the highest expected freshness gain"""
+        now = time.time() if now is None else now
+        candidates = ((url, self.freshness_gain(page, now)) for url, page in self.pages.items()
+                      if page.get("has_records"))
+        return heapq.nlargest(budget, candidates, key=lambda item: item[1])
+    
+    def save(self):
+        with open(self.state_file, "w", encoding="utf-8") as f:
+            json.dump(self.pages, f)
+
+class RetryQueue:
+    """Time-ordered delay queue for URLs that failed with a transient error
+    
+    Each failure reschedules the URL with exponential backoff (plus jitter); after
+    max_attempts failures it is appended to the dead-letter file instead.
+    """
+    
+    def __init__(self, dead_letter_path, max_attempts=4, base_delay=5.0, max_delay=600.0):
+        self.dead_letter_path = dead_letter_path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.heap = []  # (due wall-clock time, seq, url)
+        self.attempts = {}  # url -> failed attempts so far
+        self.errors = {}  # url -> last error
+        self.seq = 0
+        self.dead_lettered = 0
+    
+    def __len__(self):
+        return len(self.heap)
+    
+    def failed(self, url, error):
+        """Record a failed attempt; returns True if the URL was rescheduled"""
+        attempts = self.attempts.get(url, 0) + 1
+        if attempts >= self.max_attempts:
+            self.attempts.pop(url, None)
+            self.errors.pop(url, None)
+            self.dead_letter(url, attempts, error)
+            return False
+        self.attempts[url] = attempts
+        self.errors[url] = error
+        delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay) * random.uniform(0.8, 1.2)
+        self._push(url, time.time() + delay)
+        return True
+    
+    def succeeded(self, url):
+        self.attempts.pop(url, None)
+        self.errors.pop(url, None)
+    
+    def pop_due(self, now=None):
+        """Return a URL whose retry time has come, or None"""
+        now = time.time() if now is None else now
+        if self.heap and self.heap[0][0] <= now:
+            return heapq.heappop(self.heap)[2]
+        return None
+    
+    def next_due(self):
+        return self.heap[0][0] if self.heap else None
+    
+    def dead_letter(self, url, attempts, error):
+        self.dead_lettered += 1
+        with open(self.dead_letter_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"url": url, "attempts": attempts, "error": error,
+                                "failed_at": datetime.now().isoformat()}, ensure_ascii=False) + "\n")
+    
+    def _push(self, url, due):
+        heapq.heappush(self.heap, (due, self.seq, url))
+        self.seq += 1
+    
+    def state(self):
+        return [[url, self.attempts.get(url, 1), due, self.errors.get(url)] for due, _, url in sorted(self.heap)]
+    
+    def restore(self, entries):
+        for url, attempts, due, error in entries:
+            self.attempts[url] = attempts
+            self.errors[url] = error
+            self._push(url, due)
+
+class StackSampler:
+    """Low-overhead sampling profiler: a thread that records the main thread's stack"""
+    
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self.target = threading.main_thread().ident
+        self.stop_event = threading.Event()
+        self.thread = None
+    
+    def start(self):
+        self.thread = Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+    
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+    
+    def dump(self, path):
+        """Write collapsed stacks (flamegraph.pl / speedscope format) and a self-time summary"""
+        with open(path + ".collapsed", "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+        self_counts = {}
+        for stack, count in self.counts.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            self_counts[leaf] = self_counts.get(leaf, 0) + count
+        with open(path + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"{self.samples} samples every {self.interval * 1000:.1f} ms\n\n")
+            for leaf, count in sorted(self_counts.items(), key=lambda item: -item[1])[:50]:
+                f.write(f"{count / max(self.samples, 1) * 100:6.2f}%  {leaf}\n")
+
+class CrawlProfiler:
+    """On-demand profiling of a running crawl, toggled by SIGUSR1 or a control file"""
+    
+    def __init__(self, output_dir, control_file, check_interval=2.0, sample_interval=0.005):
+        self.output_dir = output_dir
+        self.control_file = control_file
+        self.check_interval = check_interval
+        self.sample_interval = sample_interval
+        self.active = None  # cProfile.Profile or StackSampler while running
+        self.signal_toggle = False
+        self.next_check = 0.0
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._on_signal)
+    
+    def _on_signal(self, signum, frame):
+        # Applied from poll() so profiling starts/stops between pages
+        self.signal_toggle = True
+    
+    def poll(self):
+        """Called once per crawl iteration; cheap unless a toggle is pending"""
+        if self.signal_toggle:
+            self.signal_toggle = False
+            if self.active:
+                self.stop()
+            else:
+                self.start("cprofile")
+            return
+        now = time.monotonic()
+        if now < self.next_check:
+            return
+        self.next_check = now + self.check_interval
+        requested = os.path.exists(self.control_file)
+        if requested and not self.active:
+            try:
+                with open(self.control_file, "r", encoding="utf-8") as f:
+                    mode = f.read().strip().lower() or "cprofile"
+            except OSError:
+                mode = "cprofile"
+            self.start(mode)
+        elif not requested and self.active:
+            self.stop()
+    
+    def start(self, mode="cprofile"):
+        if mode == "sample":
+            self.active = StackSampler(self.sample_interval)
+            self.active.start()
+        else:
+            self.active = cProfile.Profile()
+            self.active.enable()
+        self.mode = "sample" if mode == "sample" else "cprofile"
+        self.started_at = datetime.now()
+        print(f"\n🔬 Profiling started ({mode})")
+    
+    def stop(self):
+        if not self.active:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        path = os.path.join(self.output_dir, f"crawl-{self.started_at.strftime('%Y%m%d-%H%M%S')}-{self.mode}")
+        if isinstance(self.active, StackSampler):
+            self.active.stop()
+            self.active.dump(path)
+            print(f"\n🔬 Profiling stopped - samples saved to {path}.collapsed / .txt")
+        else:
+            self.active.disable()
+            self.active.dump_stats(path + ".prof")
+            with open(path + ".txt", "w", encoding="utf-8") as f:
+                stats = pstats.Stats(self.active, stream=f).sort_stats("cumulative")
+                stats.print_stats(40)
+                # Profiling starts inside the module-level crawl loop, so the loop frame itself is not
+                # recorded; its direct calls are the top cumulative entries above
+                stats.print_callees(r"process_content|extract_structured_sections|generate_question_response_pairs")
+            print(f"\n🔬 Profiling stopped - stats saved to {path}.prof / .txt")
+        self.active = None
+
+class PageTrace:
+    """Always-on per-URL stage timings; pages above the slow percentile go to a rotating log"""
+    
+    def __init__(self, log_path, percentile=99.9, min_samples=1000, window=100000):
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.totals = deque(maxlen=window)  # Recent page times for the percentile estimate
+        self.threshold = None
+        self.since_threshold = 0  # Pages timed since the threshold was last recomputed
+        self.url = None
+        self.logger = logging.getLogger(f"binaryheart.slow_pages.{log_path}")
+        self.logger.propagate = False
+        if not self.logger.handlers:
+            handler = logging.handlers.RotatingFileHandler(log_path, maxBytes=5 * 1024 * 1024,
+                                                           backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(asctime)s\t%(message)s"))
+            self.logger.addHandler(handler)
+        self.logger.setLevel(logging.INFO)
+    
+    def start(self, url):
+        """Begin timing a page (finishing the previous one)"""
+        self.finish()
+        self.url = url
+        self.size = 0
+        self.stages = []
+        self.started = self.last = time.perf_counter()
+    
+    def mark(self, stage):
+        """Close the current stage"""
+        if self.url is None:
+            return
+        now = time.perf_counter()
+        self.stages.append((stage, now - self.last))
+        self.last = now
+    
+    def finish(self):
+        if self.url is None:
+            return
+        total = time.perf_counter() - self.started
+        self.totals.append(total)
+        self.since_threshold += 1
+        if self.since_threshold >= self.min_samples:
+            self.since_threshold = 0
+            ordered = sorted(self.totals)
+            self.threshold = ordered[min(int(len(ordered) * self.percentile / 100), len(ordered) - 1)]
+        if self.threshold is not None and total > self.threshold:
+            stages = " ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in self.stages)
+            self.logger.info(f"{total * 1000:.0f}ms\t{self.size}B\t{self.url}\t{stages}")
+        self.url = None
+
+class RedirectMap:
+    """Persistent map from every redirect hop to the URL the chain ended at"""
+    
+    def __init__(self, path, max_hops=10):
+        self.path = path
+        self.max_hops = max_hops
+        self.targets = {}
+        if os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.targets = json.load(f)
+            except (OSError, ValueError):
+                self.targets = {}
+    
+    def __len__(self):
+        return len(self.targets)
+    
+    def record(self, hops, final_url):
+        """Record a redirect chain; returns every URL in it (hops and final)"""
+        for hop in hops:
+            if hop != final_url:
+                self.targets[hop] = final_url
+        return set(hops) | {final_url}
+    
+    def resolve(self, url):
+        """Final target of url (itself if it is not a known redirect)"""
+        for _ in range(self.max_hops):
+            target = self.targets.get(url)
+            if target is None or target == url:
+                break
+            url = target
+        return url
+    
+    def save(self):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self.targets, f)
+
+class RecordWriter:
+    """Appends records to the JSONL output from a background thread with group commit"""
+    
+    _CLOSE = object()
+    
+    def __init__(self, path, max_queue=2000, batch_size=200, flush_interval=2.0, fsync="none", on_commit=None):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.on_commit = on_commit  # Called with each committed batch (query index), in the writer thread
+        self.queue = queue.Queue(max_queue)
+        self.written = 0
+        self.errors = 0
+        self.thread = Thread(target=self._run, daemon=True, name="record-writer")
+        self.thread.start()
+    
+    def put(self, record):
+        """Queue a record (blocks while the queue is full)"""
+        self.queue.put(record)
+    
+    def flush(self):
+        """Block until every record queued so far is written"""
+        done = threading.Event()
+        self.queue.put(done)
+        done.wait()
+    
+    def close(self):
+        self.queue.put(self._CLOSE)
+        self.thread.join()
+    
+    def _serialize(self, record):
+        if ORJSON_SUPPORT:
+            return orjson.dumps(record)
+        return json.dumps(record, ensure_ascii=False).encode("utf-8")
+    
+    def _commit(self, f, batch):
+        if not batch:
+            return
+        try:
+            f.write(b"".join(self._serialize(r) + b"\n" for r in batch))
+            f.flush()
+            if self.fsync == "batch":
+                os.fsync(f.fileno())
+            if self.on_commit:
+                self.on_commit(batch)
+            self.written += len(batch)
+        except Exception as e:
+            self.errors += 1
+            print(f"\n⚠️  Record writer failed to commit {len(batch)} records: {e}")
+        batch.clear()
+    
+    def _run(self):
+        batch = []
+        deadline = None
+        with open(self.path, "ab", buffering=1 << 20) as f:
+            while True:
+                timeout = max(deadline - time.monotonic(), 0) if batch else None
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    self._commit(f, batch)  # Oldest record reached WRITE_FLUSH_INTERVAL
+                    continue
+                if item is self._CLOSE:
+                    self._commit(f, batch)
+                    if self.fsync != "none":
+                        os.fsync(f.fileno())
+                    break
+                if isinstance(item, threading.Event):
+                    self._commit(f, batch)
+                    item.set()
+                    continue
+                if not batch:
+                    deadline = time.monotonic() + self.flush_interval
+                batch.append(item)
+                if len(batch) >= self.batch_size:
+                    self._commit(f, batch)
 
 # Load existing progress if available
 visited_urls = set()
-url_queue = deque()
-records = []
+url_queue = SpillFrontier(frontier_dir, FRONTIER_HOT_SIZE, FRONTIER_SEGMENT_SIZE, skip=lambda u: u in visited_urls)
+retry_queue = RetryQueue(dead_letter_file, RETRY_MAX_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY)
+crawl_profiler = CrawlProfiler(profile_dir, profile_control_file, PROFILE_CHECK_INTERVAL, PROFILE_SAMPLE_INTERVAL)
+page_trace = PageTrace(slow_page_log, SLOW_PAGE_PERCENTILE, SLOW_PAGE_MIN_SAMPLES)
 is_resuming = False
+content_index = {}  # Content fingerprint -> URL of the first page with that body
+content_aliases = {}  # Original URL -> other URLs that served the same body
+duplicate_pages = 0  # Fetched pages skipped because their body was already processed
+redirect_map = RedirectMap(redirect_map_file)
+prefilter_rejections = Counter()  # Prefilter rejection reason -> pages
+recrawl_scheduler = RecrawlScheduler(recrawl_state_file)
+replaced_urls = set()  # URLs whose content changed; their older records are dropped at the end
+run_started_at = datetime.now().isoformat()
+saved_frontier = None  # Frontier of the interrupted crawl, kept untouched during a recrawl
 
 # Create session with connection pooling for faster requests
 def create_session():
@@ -186,10 +894,13 @@ def create_session():
     
     # Configure retry strategy (reduced for speed)
     try:
+        # Connection errors only: 429/5xx responses come back to the crawl loop, where the
+        # retry queue reschedules them without blocking on Retry-After
         retry_strategy = Retry(
             total=1,  # Only retry once for speed
             backoff_factor=0.1,
-            status_forcelist=[429, 500, 502, 503, 504],
+            status=0,
+            respect_retry_after_header=False,
             allowed_methods=["GET"]
         )
         
@@ -210,6 +921,7 @@ def create_session():
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
         'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
         'Accept-Language': 'en-US,en;q=0.5',
+        'Accept-Encoding': ACCEPT_ENCODING,
         'Connection': 'keep-alive',
     })
     
@@ -218,22 +930,217 @@ def create_session():
 # Create global session for connection pooling (faster than creating new sessions)
 http_session = create_session()
 
+class DnsCache:
+    """In-process TTL cache in front of socket.getaddrinfo
+    
+    Every new TCP connection resolves its host, so the lookup count doubles as the
+    number of connections opened by either transport.
+    """
+    
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self.cache = {}
+        self.lock = Lock()
+        self.lookups = 0
+        self.hits = 0
+        self.original = None
+    
+    def install(self):
+        if self.original is None:
+            self.original = socket.getaddrinfo
+            socket.getaddrinfo = self.getaddrinfo
+    
+    def getaddrinfo(self, host, port, *args, **kwargs):
+        key = (host, port, args, tuple(sorted(kwargs.items())))
+        now = time.monotonic()
+        with self.lock:
+            self.lookups += 1
+            cached = self.cache.get(key)
+            if cached and cached[0] > now:
+                self.hits += 1
+                return cached[1]
+        result = self.original(host, port, *args, **kwargs)
+        with self.lock:
+            self.cache[key] = (now + self.ttl, result)
+        return result
+
+dns_cache = DnsCache(DNS_CACHE_TTL)
+dns_cache.install()
+
+FetchResult = namedtuple("FetchResult", ["url", "status_code", "text", "content", "headers", "history", "wire_bytes"])
+
+class TransportStats:
+    """Bytes on the wire and connections opened, for comparing backends"""
+    
+    def __init__(self):
+        self.pages = 0
+        self.wire_bytes = 0
+        self.decoded_bytes = 0
+    
+    def record(self, wire_bytes, decoded_bytes):
+        self.pages += 1
+        self.wire_bytes += wire_bytes
+        self.decoded_bytes += decoded_bytes
+    
+    def summary(self, backend):
+        pages = max(self.pages, 1)
+        connections = dns_cache.lookups
+        return (f"🌐 Transport ({backend}): {self.pages} pages, "
+                f"{self.wire_bytes / 1e6:.1f} MB on the wire ({self.decoded_bytes / 1e6:.1f} MB decoded, "
+                f"{self.wire_bytes / pages / 1024:.1f} KB/page), "
+                f"{connections} connections opened ({connections * 1000 / pages:.0f} per 1000 pages), "
+                f"DNS cache hits: {dns_cache.hits}")
+
+class RequestsTransport:
+    """Default transport: the shared requests session (HTTP/1.1, one request per connection at a time)"""
+    name = "requests"
+    supports_prefetch = False
+    
+    def __init__(self, session):
+        self.session = session
+        self.stats = TransportStats()
+    
+    def fetch(self, url, timeout=10):
+        response = self.session.get(url, timeout=timeout, allow_redirects=True, stream=False)
+        content = response.content
+        # urllib3 counts the raw (still compressed) bytes read from the socket
+        try:
+            wire_bytes = response.raw.tell()
+        except Exception:
+            wire_bytes = int(response.headers.get("Content-Length") or len(content))
+        self.stats.record(wire_bytes, len(content))
+        return FetchResult(response.url, response.status_code, response.text, content, response.headers,
+                           [r.url for r in response.history], wire_bytes)
+    
+    def prefetch(self, urls):
+        pass
+    
+    def close(self):
+        self.session.close()
+
+class Http2Transport:
+    """HTTP/2 transport: one httpx.AsyncClient on a background event loop
+    
+    Requests to the same host share a connection as concurrent streams. prefetch() starts
+    fetches for upcoming frontier URLs so they download while the current page is processed.
+    Errors are re-raised as the equivalent requests exceptions so callers handle both backends alike.
+    """
+    name = "http2"
+    supports_prefetch = True
+    
+    def __init__(self, headers, prefetch_depth=8, max_connections=20):
+        self.prefetch_depth = prefetch_depth
+        self.stats = TransportStats()
+        self.pending = OrderedDict()  # url -> concurrent.futures.Future
+        self.loop = asyncio.new_event_loop()
+        self.thread = Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+        
+        async def make_client():
+            return httpx.AsyncClient(
+                http2=True,
+                headers=headers,
+                follow_redirects=True,
+                limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            )
+        self.client = self._submit(make_client()).result()
+    
+    def _submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+    
+    def prefetch(self, urls):
+        for url in urls:
+            if url in self.pending:
+                continue
+            if len(self.pending) >= self.prefetch_depth:
+                # Drop the oldest speculative fetch (its URL was probably skipped)
+                _, stale = self.pending.popitem(last=False)
+                stale.cancel()
+            self.pending[url] = self._submit(self.client.get(url, timeout=10))
+    
+    def fetch(self, url, timeout=10):
+        future = self.pending.pop(url, None) or self._submit(self.client.get(url, timeout=timeout))
+        try:
+            response = future.result(timeout + 5)
+        except httpx.TimeoutException as e:
+            raise requests.exceptions.Timeout(str(e))
+        except httpx.TransportError as e:
+            raise requests.exceptions.ConnectionError(str(e))
+        except (httpx.HTTPError, httpx.InvalidURL) as e:
+            raise requests.exceptions.RequestException(str(e))
+        except Exception as e:
+            # concurrent.futures timeout or cancellation
+            raise requests.exceptions.Timeout(str(e))
+        content = response.content
+        self.stats.record(response.num_bytes_downloaded, len(content))
+        return FetchResult(str(response.url), response.status_code, response.text, content, response.headers,
+                           [str(r.url) for r in response.history], response.num_bytes_downloaded)
+    
+    def close(self):
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+        try:
+            self._submit(self.client.aclose()).result(10)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+def create_transport(backend):
+    """Create the configured HTTP transport, falling back to requests"""
+    if backend == "http2":
+        if HTTP2_SUPPORT:
+            # Connection-specific headers are not allowed in HTTP/2, and httpx advertises
+            # the encodings its own decoders support
+            headers = {k: v for k, v in http_session.headers.items() if k.lower() not in ("connection", "accept-encoding")}
+            return Http2Transport(headers, prefetch_depth=PREFETCH_DEPTH)
+        print("⚠️  HTTP/2 backend needs httpx[http2] - falling back to requests")
+    return RequestsTransport(http_session)
+
+transport = create_transport(HTTP_BACKEND)
+
 if os.path.exists(progress_file):
     print("📂 Loading previous progress...")
     with open(progress_file, "r", encoding="utf-8") as f:
         progress = json.load(f)
         visited_urls = set(progress.get("visited_urls", []))
-        url_queue = deque(progress.get("url_queue", []))
+        if RECRAWL_MODE:
+            saved_frontier = {"url_queue": progress.get("url_queue", []),
+                              "frontier_segments": progress.get("frontier_segments", [])}
+        else:
+            url_queue.restore(progress.get("url_queue", []), progress.get("frontier_segments", []))
+        retry_queue.restore(progress.get("retry_queue", []))
+        content_index = progress.get("content_index", {})
+        content_aliases = progress.get("content_aliases", {})
+        prefilter_rejections.update(progress.get("prefilter_rejections", {}))
         print(f"   Resuming: {len(visited_urls)} visited, {len(url_queue)} in queue")
         is_resuming = True
-else:
+elif not RECRAWL_MODE:
     # Starting fresh - clear output file
     if os.path.exists(output_file):
         os.remove(output_file)
+    url_queue.clear_spill_dir()
+    for index_path in (index_file, index_file + "-wal", index_file + "-shm"):  # WAL-mode index and its side files
+        if os.path.exists(index_path):
+            os.remove(index_path)
+
+# Open the query index, catching up with records saved before it was enabled
+dataset_index = None
+if BUILD_INDEX:
+    if INDEX_SUPPORT:
+        dataset_index = DatasetIndex(index_file)
+        if len(dataset_index) == 0 and os.path.exists(output_file):
+            print(f"   Indexed {dataset_index.build(output_file)} existing records")
+    else:
+        print("⚠️  BUILD_INDEX needs dataset_index.py next to this script - index disabled")
+
+# Records are appended by a writer thread; the index is updated with each committed batch
+record_writer = RecordWriter(output_file, WRITE_QUEUE_SIZE, WRITE_BATCH_SIZE, WRITE_FLUSH_INTERVAL, WRITE_FSYNC,
+                             on_commit=dataset_index.add_records if dataset_index is not None else None)
 
 # Count existing documents if resuming
 existing_docs = 0
-if is_resuming and os.path.exists(output_file):
+if (is_resuming or RECRAWL_MODE) and os.path.exists(output_file):
     try:
         with open(output_file, "r", encoding="utf-8") as f:
             existing_docs = sum(1 for line in f if line.strip())
@@ -241,34 +1148,184 @@ if is_resuming and os.path.exists(output_file):
     except:
         pass
 
-# Initialize queue with seed URLs
-if not url_queue:
-    for url in SEED_URLS:
-        if url not in visited_urls:
-            url_queue.append(url)
+UrlDecision = namedtuple("UrlDecision", ["allowed", "skip", "priority"])
+
+class UrlPolicy:
+    """URL filtering engine: host-suffix trie, compiled patterns and per-domain rules"""
+    
+    def __init__(self, allowed_domains, skip_patterns, priority_patterns, domain_rules=None, cache_size=65536):
+        self.domain_rules = {d.lower(): r for d, r in (domain_rules or {}).items()}
+        self.allowed = {d.lower() for d in allowed_domains}
+        
+        # Reversed-label trie: "support.hp.com" -> com -> hp -> support
+        # so "notdell.com" can never match "dell.com"
+        self.trie = {}
+        for domain in self.allowed | set(self.domain_rules):
+            node = self.trie
+            for label in reversed(domain.split('.')):
+                node = node.setdefault(label, {})
+            node["$"] = domain
+        
+        # One alternation per pattern list instead of a re.search per pattern
+        self.skip_re = self._compile(skip_patterns)
+        self.priority_re = self._compile(priority_patterns)
+        self.deny_res = {d: self._compile(r.get("deny", [])) for d, r in self.domain_rules.items()}
+        
+        self.decide = lru_cache(maxsize=cache_size)(self._decide)
+    
+    @staticmethod
+    def _compile(patterns):
+        if not patterns:
+            return None
+        return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+    
+    def match_domains(self, host):
+        """Return configured domains that are label suffixes of host (least to most specific)"""
+        matches = []
+        node = self.trie
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                break
+            if "$" in node:
+                matches.append(node["$"])
+        return matches
+    
+    def _decide(self, url):
+        parsed = urlparse(url)
+        host = (parsed.hostname or "").lower()
+        domains = self.match_domains(host)
+        
+        allowed = any(d in self.allowed for d in domains)
+        skip = bool(self.skip_re and self.skip_re.search(url))
+        priority = 1 if self.priority_re and self.priority_re.search(url) else 0
+        
+        # Apply per-domain rules, most specific domain last so it wins
+        for domain in domains:
+            rule = self.domain_rules.get(domain)
+            if not rule:
+                continue
+            if "allow" in rule:
+                allowed = bool(rule["allow"])
+            deny_re = self.deny_res.get(domain)
+            if deny_re and deny_re.search(url):
+                skip = True
+            if rule.get("max_depth") is not None:
+                depth = len([s for s in parsed.path.split('/') if s])
+                if depth > rule["max_depth"]:
+                    skip = True
+            priority += rule.get("priority", 0)
+        
+        return UrlDecision(allowed, skip, priority)
+
+url_policy = UrlPolicy(ALLOWED_DOMAINS, SKIP_PATTERNS, PRIORITY_PATTERNS, DOMAIN_RULES,
+                       cache_size=URL_DECISION_CACHE_SIZE)
 
 def is_allowed_domain(url):
     """Check if URL is from an allowed domain"""
-    parsed = urlparse(url)
-    domain = parsed.netloc.lower()
-    for allowed in ALLOWED_DOMAINS:
-        if allowed in domain:
-            return True
-    return False
+    return url_policy.decide(url).allowed
 
 def should_skip_url(url):
     """Check if URL should be skipped"""
-    for pattern in SKIP_PATTERNS:
-        if re.search(pattern, url, re.IGNORECASE):
-            return True
-    return False
+    return url_policy.decide(url).skip
 
 def get_url_priority(url):
     """Get priority score for URL (higher = more important)"""
-    for pattern in PRIORITY_PATTERNS:
-        if re.search(pattern, url, re.IGNORECASE):
-            return 1
-    return 0
+    return url_policy.decide(url).priority
+
+if RECRAWL_MODE:
+    # Refresh the pages most likely to have changed, within the fetch budget
+    for url, gain in recrawl_scheduler.schedule(RECRAWL_BUDGET):
+        # The crawl loop jumps straight to a known redirect target, so that must be fetchable too
+        visited_urls.discard(url)
+        visited_urls.discard(redirect_map.resolve(url))
+        url_queue.push(url, gain)
+    print(f"🔄 Recrawl mode: {len(url_queue)} pages scheduled by expected freshness gain")
+
+class LinkYieldModel:
+    """Online logistic regression predicting whether a link leads to a page that yields records
+    
+    Features are hashed (crc32) tokens from the URL host and path, the anchor text, the
+    parent page's yield and the URL policy priority. Weights are updated with one SGD step
+    per fetched page, labelled by whether generate_question_response_pairs produced records.
+    """
+    
+    def __init__(self, path, bits=18, learning_rate=0.05, context_size=200000):
+        self.path = path
+        self.mask = (1 << bits) - 1
+        self.learning_rate = learning_rate
+        self.weights = array('d', [0.0]) * (1 << bits)
+        self.context = OrderedDict()  # url -> array('I') of feature indices captured when the link was queued
+        self.context_size = context_size
+        self.updates = 0
+        self.positives = 0
+        if os.path.exists(path):
+            try:
+                with open(path, "rb") as f:
+                    loaded = array('d')
+                    loaded.fromfile(f, len(self.weights))
+                    self.weights = loaded
+                return
+            except (OSError, EOFError):
+                self.weights = array('d', [0.0]) * (1 << bits)
+        # Cold start: rank like the old pattern priority until there is data to learn from
+        for level in range(1, 6):
+            self.weights[self._index(f"prio:{level}")] = float(level)
+    
+    def _index(self, feature):
+        return zlib.crc32(feature.encode("utf-8")) & self.mask
+    
+    def features(self, url, anchor="", parent_yield=None):
+        parsed = urlparse(url)
+        path_tokens = [t for t in re.split(r"[^a-z0-9]+", parsed.path.lower()) if t and not t.isdigit()]
+        names = ["bias", f"host:{(parsed.hostname or '').lower()}",
+                 f"depth:{min(parsed.path.count('/'), 8)}", f"prio:{get_url_priority(url)}"]
+        names.extend(f"path:{t}" for t in path_tokens[:12])
+        names.extend(f"anchor:{t}" for t in re.findall(r"[a-z0-9]+", (anchor or "").lower())[:8])
+        if parent_yield is not None:
+            names.append(f"parent:{min(parent_yield, 4)}")
+        return [self._index(name) for name in names]
+    
+    def score(self, indices):
+        z = sum(self.weights[i] for i in indices)
+        return 1.0 / (1.0 + math.exp(-max(min(z, 30.0), -30.0)))
+    
+    def score_link(self, url, anchor="", parent_yield=None):
+        """Score a newly discovered link, remembering its features for the later update"""
+        indices = self.features(url, anchor, parent_yield)
+        # Packed 4-byte indices: a list of ints costs ~4x as much across the 200k entries
+        self.context[url] = array('I', indices)
+        if len(self.context) > self.context_size:
+            self.context.popitem(last=False)
+        return self.score(indices)
+    
+    def update(self, url, yielded):
+        """One SGD step on a fetched URL (features from when it was queued, else URL-only)"""
+        indices = self.context.pop(url, None) or self.features(url)
+        gradient = (1.0 if yielded else 0.0) - self.score(indices)
+        step = self.learning_rate * gradient
+        for i in indices:
+            self.weights[i] += step
+        self.updates += 1
+        self.positives += 1 if yielded else 0
+    
+    def save(self):
+        with open(self.path, "wb") as f:
+            self.weights.tofile(f)
+
+link_model = LinkYieldModel(link_model_file, LINK_MODEL_BITS, LINK_MODEL_LEARNING_RATE) if FOCUSED_CRAWL else None
+
+def link_priority(url, anchor="", parent_yield=None):
+    """Frontier priority for a discovered link"""
+    if link_model:
+        return link_model.score_link(url, anchor, parent_yield)
+    return get_url_priority(url)
+
+# Initialize queue with seed URLs
+if not url_queue and not RECRAWL_MODE:
+    for url in SEED_URLS:
+        if url not in visited_urls:
+            url_queue.push(url, link_priority(url))
 
 def is_404_page(html):
     """Check if HTML content indicates a 404 error page"""
@@ -330,8 +1387,64 @@ def is_404_content(text):
     
     return False
 
-def extract_links(html, base_url):
-    """Extract all links from HTML"""
+HTML_LANG_RE = re.compile(r"<html\b[^>]*?\blang\s*=\s*[\"']?([a-zA-Z_-]+)", re.IGNORECASE)
+TITLE_RE = re.compile(r"<title[^>]*>(.*?)</title>", re.IGNORECASE | re.DOTALL)
+META_LOCALE_RE = re.compile(r"<meta\b[^>]*?(?:property|name)\s*=\s*[\"']og:locale[\"'][^>]*?content\s*=\s*[\"']([a-zA-Z_-]+)", re.IGNORECASE)
+META_NOINDEX_RE = re.compile(r"<meta\b[^>]*?name\s*=\s*[\"']robots[\"'][^>]*?content\s*=\s*[\"'][^\"']*noindex", re.IGNORECASE)
+PASSWORD_INPUT_RE = re.compile(r"<input\b[^>]*?type\s*=\s*[\"']?password", re.IGNORECASE)
+FORM_RE = re.compile(r"<form\b.*?</form\s*>", re.IGNORECASE | re.DOTALL)
+PREFILTER_TITLE_RE = re.compile("|".join(f"(?:{p})" for p in PREFILTER_TITLE_PATTERNS), re.IGNORECASE)
+SCRIPT_STYLE_RE = re.compile(r"<(script|style|noscript)\b.*?</\1\s*>", re.IGNORECASE | re.DOTALL)
+ANCHOR_RE = re.compile(r"<a\b[^>]*>(.*?)</a\s*>", re.IGNORECASE | re.DOTALL)
+TAG_RE = re.compile(r"<[^>]+>")
+
+# Rejections after which the page's links are not followed either
+PREFILTER_NO_LINK_REASONS = {"language_header", "html_lang", "meta_locale"}
+
+def is_accepted_language(lang):
+    lang = lang.lower().replace("_", "-")
+    return any(lang == accepted or lang.startswith(accepted + "-") for accepted in PREFILTER_LANGUAGES)
+
+def visible_text_length(fragment):
+    return len(" ".join(TAG_RE.sub(" ", fragment).split()))
+
+def prefilter_page(headers, html):
+    """Cheap pre-extraction check; returns a rejection reason or None to keep the page"""
+    content_type = (headers.get("Content-Type") or "").lower()
+    if content_type and "html" not in content_type:
+        return "content_type"
+    content_language = headers.get("Content-Language")
+    if content_language and not any(is_accepted_language(l.strip()) for l in content_language.split(",")):
+        return "language_header"
+    
+    head = html[:PREFILTER_HEAD_CHARS]
+    match = HTML_LANG_RE.search(head)
+    if match and not is_accepted_language(match.group(1)):
+        return "html_lang"
+    match = META_LOCALE_RE.search(head)
+    if match and not is_accepted_language(match.group(1)):
+        return "meta_locale"
+    match = TITLE_RE.search(head)
+    if match and len(match.group(1).strip()) <= PREFILTER_TITLE_MAX_CHARS and PREFILTER_TITLE_RE.search(match.group(1)):
+        return "title"
+    if META_NOINDEX_RE.search(head):
+        return "noindex"
+    
+    body_start = html.find("<body")
+    body = SCRIPT_STYLE_RE.sub(" ", html[max(body_start, 0):max(body_start, 0) + PREFILTER_DENSITY_CHARS])
+    total_text = visible_text_length(body)
+    link_text = sum(visible_text_length(anchor) for anchor in ANCHOR_RE.findall(body))
+    if PASSWORD_INPUT_RE.search(body):
+        # Forums put a guest login form in every page header - only reject pages that are little more than the form
+        form_text = sum(visible_text_length(form) for form in FORM_RE.findall(body) if PASSWORD_INPUT_RE.search(form))
+        if total_text - link_text - form_text < PREFILTER_LOGIN_MAX_TEXT:
+            return "login_form"
+    if total_text >= MIN_TEXT_LENGTH and link_text / total_text > PREFILTER_MAX_LINK_DENSITY:
+        return "link_density"
+    return None
+
+def extract_links(html, base_url, with_anchors=False):
+    """Extract all links from HTML (as (url, anchor text) pairs if with_anchors)"""
     try:
         soup = BeautifulSoup(html, 'html.parser')
         links = []
@@ -341,9 +1454,10 @@ def extract_links(html, base_url):
             absolute_url = urljoin(base_url, href)
             # Remove fragment
             absolute_url = absolute_url.split('#')[0]
-            if absolute_url.startswith('http') and is_allowed_domain(absolute_url):
-                if not should_skip_url(absolute_url):
-                    links.append(absolute_url)
+            if absolute_url.startswith('http'):
+                decision = url_policy.decide(absolute_url)
+                if decision.allowed and not decision.skip:
+                    links.append((absolute_url, a.get_text(" ", strip=True)) if with_anchors else absolute_url)
         return links
     except Exception as e:
         return []
@@ -367,7 +1481,7 @@ def extract_pdf_text(url):
     
     try:
         # Use session for connection pooling
-        response = http_session.get(url, timeout=20, stream=False)
+        response = transport.fetch(url, timeout=20)
         if response.status_code != 200:
             return None
         
@@ -397,9 +1511,259 @@ def extract_pdf_text(url):
     except Exception as e:
         return None
 
-def extract_structured_sections(text, url):
+# Site-specific extractors: pull text and sections straight from JSON-LD, embedded JSON
+# or known article markup. Each returns {"text": ..., "sections": {...}} or None, in which
+# case process_content falls back to the generic trafilatura + heuristics path.
+SITE_EXTRACTORS = []
+
+def register_extractor(host_suffix, url_pattern=None):
+    """Register a site extractor for a host suffix and optional URL regex"""
+    def decorator(func):
+        pattern = re.compile(url_pattern, re.IGNORECASE) if url_pattern else None
+        SITE_EXTRACTORS.append((host_suffix.lower(), pattern, func))
+        return func
+    return decorator
+
+def run_site_extractor(url, html):
+    """Run the first matching site extractor, returning None if none applies or it fails"""
+    host = (urlparse(url).hostname or "").lower()
+    for host_suffix, pattern, func in SITE_EXTRACTORS:
+        if host != host_suffix and not host.endswith("." + host_suffix):
+            continue
+        if pattern and not pattern.search(url):
+            continue
+        try:
+            result = func(html, url)
+        except Exception:
+            result = None
+        if result and result.get("text"):
+            return result
+    return None
+
+JSON_LD_RE = re.compile(r'<script[^>]+type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+                        re.IGNORECASE | re.DOTALL)
+
+def extract_json_ld(html, types):
+    """Return JSON-LD objects whose @type is in `types` (flattens lists and @graph)"""
+    found = []
+    for raw in JSON_LD_RE.findall(html):
+        try:
+            data = json.loads(raw.strip())
+        except ValueError:
+            continue
+        stack = data if isinstance(data, list) else [data]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, list):
+                stack.extend(item)
+                continue
+            if not isinstance(item, dict):
+                continue
+            item_type = item.get("@type")
+            item_types = item_type if isinstance(item_type, list) else [item_type]
+            if any(t in types for t in item_types):
+                found.append(item)
+            if "@graph" in item:
+                stack.extend(item["@graph"] if isinstance(item["@graph"], list) else [item["@graph"]])
+    return found
+
+def ld_text(value):
+    """Plain text of a JSON-LD value (string, or object with text/name)"""
+    if isinstance(value, dict):
+        value = value.get("text") or value.get("name") or ""
+    if not isinstance(value, str):
+        return ""
+    if "<" in value:
+        value = BeautifulSoup(value, 'html.parser').get_text(" ")
+    return re.sub(r'\s+', ' ', value).strip()
+
+def ld_list(value):
+    """JSON-LD value as a list (a single object may stand in for a one-item list)"""
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+def parse_iso_duration(value):
+    """Convert an ISO 8601 duration like PT1H30M to minutes"""
+    match = re.match(r"P(?:(\d+)D)?T?(?:(\d+)H)?(?:(\d+)M)?", value or "")
+    if not match or not any(match.groups()):
+        return None
+    days, hours, minutes = (int(g or 0) for g in match.groups())
+    return days * 1440 + hours * 60 + minutes
+
+def format_steps(steps):
+    """Format step texts the way the procedure field is stored"""
+    return "\n".join(f"Step {i}: {step}" for i, step in enumerate(steps, 1))
+
+IFIXIT_DIFFICULTY = {
+    "very easy": "beginner",
+    "easy": "beginner",
+    "moderate": "intermediate",
+    "difficult": "expert",
+    "very difficult": "expert",
+}
+
+@register_extractor("ifixit.com", r"/(Guide|Teardown)/")
+def extract_ifixit_guide(html, url):
+    """iFixit guides: HowTo JSON-LD carries steps, tools and total time"""
+    howtos = extract_json_ld(html, {"HowTo"})
+    if not howtos:
+        return None
+    howto = howtos[0]
+    
+    steps = []
+    for step in ld_list(howto.get("step")):
+        # Steps may be grouped into HowToSection items
+        items = step.get("itemListElement") if isinstance(step, dict) else None
+        for item in (ld_list(items) if items else [step]):
+            step_text = ld_text(item)
+            if step_text:
+                steps.append(step_text)
+    tools = [ld_text(t).lower() for t in ld_list(howto.get("tool")) if ld_text(t)]
+    
+    sections = {
+        "title": ld_text(howto.get("name"))[:200] or None,
+        "tools_required": tools,
+        "procedure": format_steps(steps) if steps else None,
+    }
+    minutes = parse_iso_duration(howto.get("totalTime"))
+    if minutes:
+        sections["estimated_time"] = format_minutes(minutes)
+    difficulty = re.search(r'"difficulty"\s*:\s*"([^"]+)"', html)
+    if difficulty and difficulty.group(1).lower() in IFIXIT_DIFFICULTY:
+        sections["difficulty_level"] = IFIXIT_DIFFICULTY[difficulty.group(1).lower()]
+    
+    text = "\n".join(filter(None, [sections["title"], ld_text(howto.get("description"))] + steps))
+    return {"text": text, "sections": sections}
+
+def list_steps(container):
+    """Text of the first ordered list in a soup element"""
+    ol = container.find("ol") if container else None
+    if not ol:
+        return []
+    return [li.get_text(" ", strip=True) for li in ol.find_all("li", recursive=False) if li.get_text(strip=True)]
+
+def extract_stack_exchange_question(html, url):
+    """Stack Exchange questions: question body plus accepted (or top) answer"""
+    soup = BeautifulSoup(html, 'html.parser')
+    title_el = soup.select_one("#question-header h1") or soup.find("h1")
+    question_el = soup.select_one(".question .js-post-body")
+    answer_el = soup.select_one(".accepted-answer .js-post-body") or soup.select_one(".answer .js-post-body")
+    if not title_el or not answer_el:
+        return None
+    
+    title = title_el.get_text(" ", strip=True)
+    question = question_el.get_text(" ", strip=True) if question_el else ""
+    answer = answer_el.get_text("\n", strip=True)
+    steps = list_steps(answer_el)
+    
+    sections = {"title": title[:200]}
+    if steps:
+        sections["procedure"] = format_steps(steps)
+    return {"text": "\n".join(filter(None, [title, question, answer])), "sections": sections}
+
+# Dormant until a Stack Exchange host is crawlable: superuser.com is in PROBLEMATIC_DOMAINS
+# and the other sites are not in ALLOWED_DOMAINS
+for se_host in ("superuser.com", "serverfault.com", "stackoverflow.com", "askubuntu.com", "stackexchange.com"):
+    register_extractor(se_host, r"/questions/\d+")(extract_stack_exchange_question)
+
+@register_extractor("learn.microsoft.com")
+def extract_microsoft_learn_article(html, url):
+    """Microsoft Learn articles: the <main> content block without page chrome"""
+    soup = BeautifulSoup(html, 'html.parser')
+    main = soup.select_one("main .content") or soup.find("main")
+    if not main:
+        return None
+    for el in main.select("nav, script, style, .feedback-section, .page-metadata, .alert-holder, #article-header"):
+        el.decompose()
+    
+    title_el = main.find("h1") or soup.find("h1")
+    title = title_el.get_text(" ", strip=True) if title_el else ""
+    body = main.get_text("\n", strip=True)
+    steps = list_steps(main)
+    
+    sections = {"title": title[:200] or None}
+    if steps:
+        sections["procedure"] = format_steps(steps)
+    return {"text": body, "sections": sections}
+
+class Document:
+    """Per-document analysis shared by the section extractors and QA generators
+    
+    The lowercased text, '.'-separated sentence offsets and cleaned text are computed
+    at most once per document instead of on every keyword / generator pass.
+    """
+    __slots__ = ("text", "lower", "_cleaned", "_starts", "_ends")
+    
+    def __init__(self, text):
+        self.text = text
+        self.lower = text.lower()
+        self._cleaned = None
+        self._starts = None
+        self._ends = None
+    
+    @classmethod
+    def of(cls, text):
+        return text if isinstance(text, cls) else cls(text)
+    
+    def __len__(self):
+        return len(self.text)
+    
+    @property
+    def cleaned(self):
+        if self._cleaned is None:
+            self._cleaned = clean_text(self.text)
+        return self._cleaned
+    
+    def _split_sentences(self):
+        starts, ends = [], []
+        start = 0
+        text = self.text
+        while True:
+            end = text.find('.', start)
+            if end == -1:
+                starts.append(start)
+                ends.append(len(text))
+                break
+            starts.append(start)
+            ends.append(end)
+            start = end + 1
+        self._starts, self._ends = starts, ends
+    
+    @property
+    def sentence_count(self):
+        if self._starts is None:
+            self._split_sentences()
+        return len(self._starts)
+    
+    def sentence(self, index):
+        """Sentence `index` (same pieces as text.split('.'))"""
+        if self._starts is None:
+            self._split_sentences()
+        return self.text[self._starts[index]:self._ends[index]]
+    
+    def find_sentence(self, keyword):
+        """Index of the first sentence containing a lowercase keyword, or None"""
+        pos = self.lower.find(keyword)
+        if pos == -1:
+            return None
+        if len(self.lower) != len(self.text) or '.' in keyword:
+            # Offsets don't line up (Unicode case mapping) - scan sentence by sentence
+            for index in range(self.sentence_count):
+                if keyword in self.sentence(index).lower():
+                    return index
+            return None
+        if self._starts is None:
+            self._split_sentences()
+        return bisect.bisect_right(self._starts, pos) - 1
+
+def extract_structured_sections(text, url, known=None):
     """Extract structured sections from text (device type, component, symptom, procedure)
-    Enhanced for repair-assistant LLM training with technician-specific fields"""
+    Enhanced for repair-assistant LLM training with technician-specific fields
+    Fields already present in `known` (e.g. from a site extractor) skip their heuristics"""
+    doc = Document.of(text)
+    text = doc.text
+    known = known or {}
     sections = {
         "device_type": None,
         "component": None,
@@ -414,14 +1778,15 @@ def extract_structured_sections(text, url):
         "brand": None,
         "model": None
     }
+    sections.update(known)
     
     # Extract title (usually first line or from URL)
     lines = text.split('\n')
-    if lines:
+    if lines and "title" not in known:
         sections["title"] = lines[0].strip()[:200]
     
     # Pattern-based extraction
-    text_lower = text.lower()
+    text_lower = doc.lower
     
     # Brand extraction
     brand_patterns = {
@@ -485,7 +1850,7 @@ def extract_structured_sections(text, url):
             break
     
     # Tools required extraction
-    tool_patterns = [
+    tool_patterns = [] if "tools_required" in known else [
         r"\b(screwdriver|phillips|flathead|torx|hex)\b",
         r"\b(multimeter|voltmeter|ohmmeter)\b",
         r"\b(thermal paste|thermal compound)\b",
@@ -501,7 +1866,8 @@ def extract_structured_sections(text, url):
     for pattern in tool_patterns:
         matches = re.findall(pattern, text_lower, re.IGNORECASE)
         tools_found.update([m.lower() for m in matches if m])
-    sections["tools_required"] = list(tools_found) if tools_found else []
+    if "tools_required" not in known:
+        sections["tools_required"] = list(tools_found) if tools_found else []
     
     # Safety warnings extraction
     safety_keywords = [
@@ -511,13 +1877,10 @@ def extract_structured_sections(text, url):
     ]
     safety_found = []
     for keyword in safety_keywords:
-        if keyword in text_lower:
-            # Extract sentence containing safety warning
-            sentences = text.split('.')
-            for sentence in sentences:
-                if keyword in sentence.lower():
-                    safety_found.append(sentence.strip()[:200])
-                    break
+        # Extract sentence containing safety warning
+        index = doc.find_sentence(keyword)
+        if index is not None:
+            safety_found.append(doc.sentence(index).strip()[:200])
     sections["safety_warnings"] = safety_found[:3] if safety_found else []
     
     # Error codes extraction
@@ -538,7 +1901,8 @@ def extract_structured_sections(text, url):
     sections["error_codes"] = list(error_codes_found)[:5] if error_codes_found else []
     
     # Difficulty level estimation
-    complexity_indicators = {
+    procedure_count = len(re.findall(r"step\s+\d+", text_lower, re.IGNORECASE))
+    complexity_indicators = {} if "difficulty_level" in known else {
         "beginner": [r"\bsimple\b", r"\beasy\b", r"\bquick\b", r"\bbasic\b"],
         "intermediate": [r"\bmoderate\b", r"\bstandard\b", r"\bnormal\b"],
         "expert": [r"\badvanced\b", r"\bcomplex\b", r"\bdifficult\b", r"\brequires\s+experience\b", r"\bexpert\b", r"\bsoldering\b", r"\bcircuit\b"]
@@ -550,8 +1914,9 @@ def extract_structured_sections(text, url):
                 difficulty_scores[level] += 1
     
     # Estimate based on procedure length and complexity
-    procedure_count = len(re.findall(r"step\s+\d+", text_lower, re.IGNORECASE))
-    if procedure_count > 10 or difficulty_scores["expert"] > 0:
+    if "difficulty_level" in known:
+        pass
+    elif procedure_count > 10 or difficulty_scores["expert"] > 0:
         sections["difficulty_level"] = "expert"
     elif procedure_count > 5 or difficulty_scores["intermediate"] > 0 or len(sections["tools_required"]) > 3:
         sections["difficulty_level"] = "intermediate"
@@ -561,20 +1926,12 @@ def extract_structured_sections(text, url):
         sections["difficulty_level"] = "intermediate"  # Default
     
     # Estimated time (rough estimate based on procedure steps)
-    if procedure_count > 0:
+    if procedure_count > 0 and "estimated_time" not in known:
         # Rough estimate: 5-15 minutes per step
-        estimated_minutes = procedure_count * 10
-        if estimated_minutes < 30:
-            sections["estimated_time"] = f"{estimated_minutes} minutes"
-        elif estimated_minutes < 60:
-            sections["estimated_time"] = f"{estimated_minutes} minutes"
-        else:
-            hours = estimated_minutes // 60
-            minutes = estimated_minutes % 60
-            sections["estimated_time"] = f"{hours}h {minutes}m" if minutes > 0 else f"{hours} hours"
+        sections["estimated_time"] = format_minutes(procedure_count * 10)
     
     # Procedure extraction (look for numbered steps or instructions)
-    procedure_patterns = [
+    procedure_patterns = [] if "procedure" in known else [
         r"(step\s+\d+[:\-]?\s*[^\n]+)",
         r"(\d+[\.\)]\s*[^\n]+)",
         r"(procedure[:\-]?\s*[^\n]+)",
@@ -589,6 +1946,14 @@ def extract_structured_sections(text, url):
     
     return sections
 
+def format_minutes(total_minutes):
+    """Format a duration in minutes the way estimated_time is stored"""
+    if total_minutes < 60:
+        return f"{total_minutes} minutes"
+    hours = total_minutes // 60
+    minutes = total_minutes % 60
+    return f"{hours}h {minutes}m" if minutes > 0 else f"{hours} hours"
+
 def calculate_quality_score(metadata, text_length):
     """Calculate quality score for the record (0-1.0)"""
     score = 0.0
@@ -636,6 +2001,24 @@ def calculate_quality_score(metadata, text_length):
     
     return min(score / max_score, 1.0)
 
+def quality_features(metadata, text_length):
+    """Page-level inputs of calculate_quality_score, stored with every record so
+    rescore_dataset.py can recompute scores exactly (records only keep some fields)"""
+    return {
+        "text_length": text_length,
+        "device_type": 1 if metadata.get("device_type") else 0,
+        "component": 1 if metadata.get("component") else 0,
+        "symptom": 1 if metadata.get("symptom") else 0,
+        "procedure": 1 if metadata.get("procedure") else 0,
+        "tools_required": 1 if metadata.get("tools_required") else 0,
+        "safety_warnings": 1 if metadata.get("safety_warnings") else 0,
+        "error_codes": 1 if metadata.get("error_codes") else 0,
+        "difficulty_level": 1 if metadata.get("difficulty_level") else 0,
+        "tool_count": len(metadata.get("tools_required") or []),
+        "safety_count": len(metadata.get("safety_warnings") or []),
+        "error_code_count": len(metadata.get("error_codes") or []),
+    }
+
 def generate_technician_question(metadata, question_type="diagnosis"):
     """Generate technician-focused questions"""
     device = metadata.get("device_type", "device")
@@ -659,10 +2042,12 @@ def generate_technician_question(metadata, question_type="diagnosis"):
     return f"How do I fix {title.lower()}?"
 
 def generate_question_response_pairs(text, metadata, url):
-    """Generate question/response pairs from text and metadata
+    """Generate question/response pairs from text (or a Document) and metadata
     Enhanced for repair-assistant LLM training"""
+    doc = Document.of(text)
     pairs = []
-    text_length = len(text)
+    text_length = len(doc)
+    extracted_at = datetime.now().isoformat()
     
     # Calculate quality score
     quality_score = calculate_quality_score(metadata, text_length)
@@ -670,9 +2055,10 @@ def generate_question_response_pairs(text, metadata, url):
     # Skip low-quality records
     if quality_score < 0.3:
         return pairs
+    features = quality_features(metadata, text_length)
     
     # Build enhanced response with technician context
-    response_parts = [clean_text(text)]
+    response_parts = [doc.cleaned]
     
     # Add tools required section if available
     if metadata.get("tools_required"):
@@ -711,7 +2097,8 @@ def generate_question_response_pairs(text, metadata, url):
                 "error_codes": metadata.get("error_codes", []),
                 "estimated_time": metadata.get("estimated_time"),
                 "quality_score": round(quality_score, 2),
-                "extracted_at": datetime.now().isoformat(),
+                "quality_features": features,
+                "extracted_at": extracted_at,
                 "content_type": "full_article"
             }
         })
@@ -720,7 +2107,7 @@ def generate_question_response_pairs(text, metadata, url):
     if metadata.get("symptom"):
         symptom = metadata["symptom"]
         symptom_question = generate_technician_question(metadata, "diagnosis")
-        symptom_response = extract_symptom_section(text, symptom)
+        symptom_response = extract_symptom_section(doc, symptom)
         if symptom_response and len(symptom_response) >= 50:
             pairs.append({
                 "question": symptom_question,
@@ -734,16 +2121,19 @@ def generate_question_response_pairs(text, metadata, url):
                     "tools_required": metadata.get("tools_required", []),
                     "difficulty_level": metadata.get("difficulty_level"),
                     "quality_score": round(quality_score, 2),
-                    "extracted_at": datetime.now().isoformat(),
+                    "quality_features": features,
+                    "extracted_at": extracted_at,
                     "content_type": "symptom_specific"
                 }
             })
     
+    # Cleaned once, shared by the procedure and tools pairs
+    procedure_clean = clean_text(metadata["procedure"]) if metadata.get("procedure") else None
+    
     # Generate procedure-specific Q&A if procedure is detected
     if metadata.get("procedure"):
-        procedure = metadata["procedure"]
         procedure_question = generate_technician_question(metadata, "procedure")
-        procedure_response = clean_text(procedure)
+        procedure_response = procedure_clean
         
         # Add context to procedure
         if metadata.get("tools_required"):
@@ -763,7 +2153,8 @@ def generate_question_response_pairs(text, metadata, url):
                 "difficulty_level": metadata.get("difficulty_level"),
                 "estimated_time": metadata.get("estimated_time"),
                 "quality_score": round(quality_score, 2),
-                "extracted_at": datetime.now().isoformat(),
+                "quality_features": features,
+                "extracted_at": extracted_at,
                 "content_type": "procedure"
             }
         })
@@ -774,7 +2165,7 @@ def generate_question_response_pairs(text, metadata, url):
         tools_response = f"To fix this issue, you will need the following tools:\n\n"
         tools_response += "\n".join([f"• {tool}" for tool in metadata["tools_required"]])
         if metadata.get("procedure"):
-            tools_response += f"\n\nProcedure:\n{clean_text(metadata['procedure'])}"
+            tools_response += f"\n\nProcedure:\n{procedure_clean}"
         
         pairs.append({
             "question": tools_question,
@@ -786,7 +2177,8 @@ def generate_question_response_pairs(text, metadata, url):
                 "tools_required": metadata.get("tools_required", []),
                 "difficulty_level": metadata.get("difficulty_level"),
                 "quality_score": round(quality_score, 2),
-                "extracted_at": datetime.now().isoformat(),
+                "quality_features": features,
+                "extracted_at": extracted_at,
                 "content_type": "tools_guide"
             }
         })
@@ -794,24 +2186,42 @@ def generate_question_response_pairs(text, metadata, url):
     return pairs
 
 def extract_symptom_section(text, symptom):
-    """Extract section of text relevant to a specific symptom"""
-    sentences = text.split('.')
+    """Extract section of text (or a Document) relevant to a specific symptom"""
+    doc = Document.of(text)
     relevant_sentences = []
-    symptom_lower = symptom.lower()
-    
-    for idx, sentence in enumerate(sentences):
-        if symptom_lower in sentence.lower():
-            relevant_sentences.append(sentence.strip())
-            # Get a few sentences after for context
-            for i in range(idx + 1, min(idx + 4, len(sentences))):
-                if sentences[i].strip():
-                    relevant_sentences.append(sentences[i].strip())
-            break
+    
+    idx = doc.find_sentence(symptom.lower())
+    if idx is not None:
+        relevant_sentences.append(doc.sentence(idx).strip())
+        # Get a few sentences after for context
+        for i in range(idx + 1, min(idx + 4, doc.sentence_count)):
+            sentence = doc.sentence(i).strip()
+            if sentence:
+                relevant_sentences.append(sentence)
     
     return '. '.join(relevant_sentences[:5]) if relevant_sentences else None
 
+def content_fingerprint(text):
+    """Hash of the whitespace/case-normalized body, stable across mirrors and locale variants"""
+    normalized = " ".join(text.split()).lower()
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).hexdigest()
+
+def is_duplicate_content(digest, url):
+    """Check a body fingerprint against the content index, recording url as an alias if already seen"""
+    original_url = content_index.get(digest)
+    if original_url is None:
+        content_index[digest] = url
+        return False
+    if original_url != url:
+        aliases = content_aliases.setdefault(original_url, [])
+        if url not in aliases:
+            aliases.append(url)
+    return True
+
 def process_content(url, html=None, text=None):
     """Process content from URL and return standardized format"""
+    global duplicate_pages
+    known_sections = None
     # Check if it's a PDF
     if url.lower().endswith('.pdf'):
         text = extract_pdf_text(url)
@@ -825,27 +2235,52 @@ def process_content(url, html=None, text=None):
             if is_404_page(html):
                 return None
             
-            try:
-                text = extract(html) or ""
-            except Exception as e:
-                # Fallback to basic extraction if trafilatura fails
+            # Fast path: site-specific structured extractor
+            site_result = run_site_extractor(url, html)
+            if site_result:
+                text = site_result["text"]
+                known_sections = {k: v for k, v in site_result["sections"].items() if v}
+            else:
                 try:
-                    from bs4 import BeautifulSoup
-                    soup = BeautifulSoup(html, 'html.parser')
-                    text = soup.get_text()
-                except:
-                    return None
+                    text = extract(html) or ""
+                except Exception as e:
+                    # Fallback to basic extraction if trafilatura fails
+                    try:
+                        from bs4 import BeautifulSoup
+                        soup = BeautifulSoup(html, 'html.parser')
+                        text = soup.get_text()
+                    except:
+                        return None
         else:
             return None
     
+    page_trace.mark("extract")
     if not text or len(text) < MIN_TEXT_LENGTH:
         return None
     
+    # Track per-URL content hashes for change-aware recrawls
+    digest = content_fingerprint(text)
+    previous_digest = recrawl_scheduler.record_fetch(url, digest)
+    if previous_digest and previous_digest != digest:
+        # Page changed since its last fetch: its new records replace the old ones
+        replaced_urls.add(url)
+        if content_index.get(previous_digest) == url:
+            del content_index[previous_digest]
+    
+    # Skip everything downstream if this body was already processed (elsewhere, or unchanged)
+    if is_duplicate_content(digest, url):
+        duplicate_pages += 1
+        return None
+    
     # Clean text
     text = clean_text(text)
     
+    # One shared analysis (lowercase, sentence offsets, cleaned text) for all extractors
+    doc = Document(text)
+    
     # Extract structured sections
-    sections = extract_structured_sections(text, url)
+    sections = extract_structured_sections(doc, url, known_sections)
+    page_trace.mark("sections")
     
     # Generate title if not found
     if not sections["title"]:
@@ -853,27 +2288,92 @@ def process_content(url, html=None, text=None):
         sections["title"] = lines[0].strip()[:200] if lines else "Untitled"
     
     # Generate question/response pairs
-    qa_pairs = generate_question_response_pairs(text, sections, url)
+    qa_pairs = add_token_counts(generate_question_response_pairs(doc, sections, url))
+    page_trace.mark("qa")
+    recrawl_scheduler.record_yield(url, qa_pairs)
     
     return qa_pairs if qa_pairs else None
 
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+def load_token_counter(spec):
+    """Return a text -> token count function for the TOKENIZER setting"""
+    kind, _, arg = spec.partition(":")
+    try:
+        if kind == "tiktoken":
+            import tiktoken  # type: ignore
+            encoding = tiktoken.get_encoding(arg or "cl100k_base")
+            return lambda text: len(encoding.encode(text, disallowed_special=()))
+        if kind == "hf":
+            from tokenizers import Tokenizer  # type: ignore
+            tokenizer = Tokenizer.from_file(arg)
+            return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+    except Exception as e:
+        print(f"⚠️  Tokenizer {spec!r} unavailable ({e}) - using the regex approximation")
+    # Words and punctuation marks: a close, dependency-free stand-in for BPE counts
+    return lambda text: len(TOKEN_RE.findall(text))
+
+count_tokens = load_token_counter(TOKENIZER)
+
+def token_bucket(tokens):
+    """Smallest TOKEN_BUCKETS bound that fits, or None if longer than all of them"""
+    index = bisect.bisect_left(TOKEN_BUCKETS, tokens)
+    return TOKEN_BUCKETS[index] if index < len(TOKEN_BUCKETS) else None
+
+def add_token_counts(pairs):
+    """Store question/response token counts and the length bucket in each record's metadata"""
+    for pair in pairs:
+        metadata = pair["metadata"]
+        metadata["question_tokens"] = count_tokens(pair.get("question", ""))
+        metadata["response_tokens"] = count_tokens(pair.get("response", ""))
+        metadata["total_tokens"] = metadata["question_tokens"] + metadata["response_tokens"]
+        metadata["token_bucket"] = token_bucket(metadata["total_tokens"])
+    return pairs
+
+def shard_path(bucket):
+    name = f"tokens_le_{bucket:05d}.jsonl" if bucket is not None else f"tokens_gt_{TOKEN_BUCKETS[-1]:05d}.jsonl"
+    return os.path.join(shards_dir, name)
+
+def write_length_shards(records_to_shard):
+    """Write records into one JSONL file per token-length bucket (replacing previous shards)"""
+    os.makedirs(shards_dir, exist_ok=True)
+    for name in os.listdir(shards_dir):
+        if name.startswith("tokens_") and name.endswith(".jsonl"):
+            os.remove(os.path.join(shards_dir, name))
+    handles = {}
+    counts = Counter()
+    try:
+        for r in records_to_shard:
+            metadata = r.get("metadata")
+            if not isinstance(metadata, dict) or "total_tokens" not in metadata:
+                continue  # Older records without metadata/token counts
+            bucket = metadata.get("token_bucket")
+            if bucket not in handles:
+                handles[bucket] = open(shard_path(bucket), "w", encoding="utf-8")
+            handles[bucket].write(json.dumps(r, ensure_ascii=False) + "\n")
+            counts[bucket] += 1
+    finally:
+        for handle in handles.values():
+            handle.close()
+    return counts
+
 def save_progress():
     """Save current progress to disk"""
     progress = {
         "visited_urls": list(visited_urls),
-        "url_queue": list(url_queue),
-        "records_count": len(records)
+        **(saved_frontier if RECRAWL_MODE and saved_frontier else url_queue.state()),
+        "retry_queue": retry_queue.state(),
+        "records_count": record_writer.written,
+        "content_index": content_index,
+        "content_aliases": content_aliases,
+        "prefilter_rejections": prefilter_rejections
     }
     with open(progress_file, "w", encoding="utf-8") as f:
         json.dump(progress, f, indent=2)
-
-def save_records():
-    """Save records to JSONL file"""
-    # Append mode to preserve existing records during a single run
-    with open(output_file, "a", encoding="utf-8") as f:
-        for r in records:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
-    records.clear()  # Clear after saving
+    recrawl_scheduler.save()
+    redirect_map.save()
+    if link_model:
+        link_model.save()
 
 print(f"🚀 Starting crawl (target: {MAX_DOCUMENTS} documents)")
 print(f"   Queue: {len(url_queue)} URLs")
@@ -881,22 +2381,46 @@ print(f"   Already visited: {len(visited_urls)} URLs\n")
 
 pbar = tqdm(total=MAX_DOCUMENTS, initial=existing_docs, desc="Crawling")
 documents_collected = existing_docs
+last_saved_at = documents_collected
 
 try:
-    while url_queue and documents_collected < MAX_DOCUMENTS:
-        # Get next URL (prioritize URLs matching priority patterns)
-        current_url = None
-        priority_urls = [u for u in url_queue if get_url_priority(u) > 0]
-        if priority_urls:
-            current_url = priority_urls[0]
-            url_queue.remove(current_url)
-        else:
-            current_url = url_queue.popleft()
+    while (url_queue or retry_queue) and (RECRAWL_MODE or documents_collected < MAX_DOCUMENTS):
+        # Failed URLs whose backoff has expired are interleaved with fresh work
+        current_url = retry_queue.pop_due()
+        is_retry = current_url is not None
+        if not is_retry:
+            if not url_queue:
+                # Only retries left - wait for the next one to come due
+                time.sleep(max(0.0, min(retry_queue.next_due() - time.time(), 5.0)))
+                continue
+            # Get next URL (frontier serves URLs matching priority patterns first)
+            try:
+                current_url = url_queue.pop()
+            except IndexError:
+                if retry_queue:
+                    continue
+                break  # Only already-visited URLs were left in spilled segments
+        
+        # Go straight to the final target of a known redirect
+        resolved_url = redirect_map.resolve(current_url)
+        if resolved_url != current_url:
+            visited_urls.add(current_url)
+            current_url = resolved_url
         
-        if current_url in visited_urls:
+        if current_url in visited_urls and not is_retry:
             continue
         
+        crawl_profiler.poll()
+        page_trace.start(current_url)
+        
+        # Let multiplexing backends download upcoming pages while this one is processed
+        if transport.supports_prefetch:
+            transport.prefetch([u for u in map(redirect_map.resolve, url_queue.peek(PREFETCH_DEPTH))
+                                if u not in visited_urls and not u.lower().endswith('.pdf')
+                                and urlparse(u).netloc.lower().replace('www.', '') not in PROBLEMATIC_DOMAINS])
+        
         visited_urls.add(current_url)
+        page_url = current_url  # Final URL after redirects, used as the base for relative links
         
         try:
             # Check if domain is problematic and skip if so
@@ -911,25 +2435,42 @@ try:
             if not current_url.lower().endswith('.pdf'):
                 # Optimized: Use session with connection pooling for faster requests
                 try:
-                    # Use session directly for connection pooling (faster than trafilatura fetch_url)
-                    response = http_session.get(current_url, timeout=10, allow_redirects=True, stream=False)
+                    # Use the pooled transport directly (faster than trafilatura fetch_url)
+                    response = transport.fetch(current_url, timeout=10)
                     
                     # Check status code immediately (before processing)
                     if response.status_code == 404:
                         continue  # Skip silently
                     
+                    if response.status_code in RETRY_STATUS_CODES:
+                        retry_queue.failed(current_url, f"HTTP {response.status_code}")
+                        continue
+                    
                     if response.status_code >= 400:
                         continue  # Skip error status codes silently
                     
                     # Get HTML content
                     html = response.text
+                    retry_queue.succeeded(current_url)
+                    page_trace.size = len(response.content)
+                    
+                    # Remember the redirect chain so no hop (or the target) is fetched again
+                    if response.history or response.url != current_url:
+                        page_url = response.url
+                        already_fetched = page_url != current_url and page_url in visited_urls
+                        visited_urls.update(redirect_map.record([current_url] + list(response.history), page_url))
+                        if already_fetched:
+                            continue  # Target was already processed under its own URL
+                    page_trace.mark("fetch")
                     
                 except requests.exceptions.Timeout:
-                    # Skip timeouts silently (reduce noise)
+                    # Timeouts are usually transient - retry later with backoff
+                    retry_queue.failed(current_url, "timeout")
                     continue
                 except requests.exceptions.ConnectionError as e:
                     # Connection errors (connection pool exhausted, DNS, etc.)
-                    # Skip silently to avoid spam - these are usually temporary
+                    # These are usually temporary - retry later with backoff
+                    retry_queue.failed(current_url, f"connection error: {type(e).__name__}")
                     continue
                 except requests.exceptions.RequestException as e:
                     # Other request errors - skip silently to reduce noise
@@ -942,8 +2483,17 @@ try:
             if html and is_404_page(html):
                 continue  # Skip silently
             
-            # Process content with parsing and standardization
-            qa_pairs = process_content(current_url, html=html)
+            # Cheap rejection of non-target pages (locale, login, listing) before heavy extraction
+            prefilter_reason = prefilter_page(response.headers, html) if html and PREFILTER_ENABLED else None
+            page_trace.mark("prefilter")
+            duplicates_before = duplicate_pages
+            if prefilter_reason:
+                prefilter_rejections[prefilter_reason] += 1
+                qa_pairs = None
+            else:
+                # Process content with parsing and standardization
+                # Keyed by the final URL, so records and recrawl history follow redirects
+                qa_pairs = process_content(page_url, html=html)
             
             # Additional check: if processed content indicates 404, skip it
             if qa_pairs:
@@ -956,14 +2506,20 @@ try:
             # Save question/response pairs (standardized format)
             if qa_pairs:
                 for qa_pair in qa_pairs:
-                    records.append(qa_pair)
+                    record_writer.put(qa_pair)
                     documents_collected += 1
                     pbar.update(1)
                 pbar.set_postfix({"collected": documents_collected, "queue": len(url_queue)})
             
+            # Teach the link model whether this fetch paid off. Recrawls (old pages chosen for freshness)
+            # and duplicate bodies (unchanged or mirrored, yield unknown) say nothing about the link
+            if link_model and not RECRAWL_MODE and duplicate_pages == duplicates_before:
+                link_model.update(current_url, bool(qa_pairs))
+            
             # Extract links for further crawling (only from HTML, not PDFs)
             # Skip link extraction from problematic domains to avoid adding more problematic URLs
-            if documents_collected < MAX_DOCUMENTS and html:
+            if (documents_collected < MAX_DOCUMENTS and html and not RECRAWL_MODE
+                    and prefilter_reason not in PREFILTER_NO_LINK_REASONS):
                 # Check if domain is problematic - skip link extraction
                 parsed_url = urlparse(current_url)
                 domain = parsed_url.netloc.lower().replace('www.', '')
@@ -971,36 +2527,40 @@ try:
                 
                 if should_extract_links:
                     try:
-                        links = extract_links(html, current_url)
-                        # Limit queue size to prevent memory issues
-                        MAX_QUEUE_SIZE = 10000
+                        links = extract_links(html, page_url, with_anchors=True)
+                        parent_yield = len(qa_pairs) if qa_pairs else 0
+                        # Frontier keeps memory bounded by spilling to disk
                         links_added = 0
-                        for link in links:
+                        for link, anchor in links:
+                            # Queue the final target of links we know redirect
+                            link = redirect_map.resolve(link)
+                            
                             # Also skip links to problematic domains
                             link_parsed = urlparse(link)
                             link_domain = link_parsed.netloc.lower().replace('www.', '')
                             if link_domain in PROBLEMATIC_DOMAINS:
                                 continue  # Skip links to problematic domains
                             
-                            if link not in visited_urls and link not in url_queue:
-                                if len(url_queue) < MAX_QUEUE_SIZE:
-                                    url_queue.append(link)
-                                    links_added += 1
-                                    # Limit links added per page for speed
-                                    if links_added >= 50:  # Max 50 links per page
-                                        break
-                                else:
+                            # Only links that are actually new count towards the per-page cap
+                            if link not in visited_urls and url_queue.push(link, link_priority(link, anchor, parent_yield)):
+                                links_added += 1
+                                # Limit links added per page for speed
+                                if links_added >= MAX_LINKS_PER_PAGE:
                                     break
                     except Exception as e:
                         # If link extraction fails, continue with next URL
                         pass
+                page_trace.mark("links")
             
-            # Save progress periodically
-            if documents_collected % SAVE_INTERVAL == 0:
-                save_records()
+            # Save progress periodically (a page can add several records, so compare, not modulo)
+            if documents_collected - last_saved_at >= SAVE_INTERVAL:
+                record_writer.flush()  # Progress never claims pages whose records are not on disk
                 save_progress()
+                last_saved_at = documents_collected
                 print(f"\n💾 Progress saved: {documents_collected} documents collected")
             
+            page_trace.finish()  # Rate-limit sleep is not part of the page's time
+            
             # Rate limiting (reduced delay for faster scraping)
             # Only delay if we successfully processed a document
             if qa_pairs:
@@ -1035,10 +2595,21 @@ else:
     interrupted = False
 finally:
     # Always save final progress (ensures no data loss)
+    page_trace.finish()
+    crawl_profiler.stop()  # Dump any profile still being captured
     print("\n💾 Saving final data...")
-    save_records()  # Save any remaining records in memory
+    record_writer.close()  # Commit any records still queued
     save_progress()  # Save crawler state
     pbar.close()
+    transport.close()
+    print(transport.stats.summary(transport.name))
+    if link_model and link_model.updates:
+        print(f"🎯 Link model: {link_model.positives}/{link_model.updates} fetched pages yielded records "
+              f"({link_model.positives / link_model.updates * 100:.1f}%)")
+    if prefilter_rejections:
+        print("🚫 Prefilter rejections: " + ", ".join(f"{reason}={count}" for reason, count in prefilter_rejections.most_common()))
+    if retry_queue or retry_queue.dead_lettered:
+        print(f"🔁 Retries pending: {len(retry_queue)}, dead-lettered this run: {retry_queue.dead_lettered} ({dead_letter_file})")
     print("   Final save complete!")
 
 # Final deduplication and summary
@@ -1051,6 +2622,17 @@ if os.path.exists(output_file):
             if line.strip():  # Skip empty lines
                 try:
                     record = json.loads(line)
+                    metadata = record.get("metadata")
+                    # Drop records superseded by a newer fetch of a changed page
+                    if (isinstance(metadata, dict) and metadata.get("source_url") in replaced_urls
+                            and metadata.get("extracted_at", "") < run_started_at):
+                        continue
+                    # Attach URLs that served the same body (skipped during the crawl)
+                    if isinstance(metadata, dict) and metadata.get("source_url") in content_aliases:
+                        metadata["alias_urls"] = content_aliases[metadata["source_url"]]
+                    # Backfill token counts for records saved before they were computed
+                    if isinstance(metadata, dict) and "total_tokens" not in metadata and "response" in record:
+                        add_token_counts([record])
                     # Deduplicate based on response content (standardized format)
                     response_text = record.get("response", "")[:5000]
                     if response_text and response_text not in seen_responses:
@@ -1064,9 +2646,21 @@ if os.path.exists(output_file):
         for r in unique_records:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
     
+    if WRITE_LENGTH_SHARDS:
+        shard_counts = write_length_shards(unique_records)
+        print(f"📦 Length shards in {shards_dir}: " + ", ".join(
+            f"{'≤' + str(bucket) if bucket is not None else '>' + str(TOKEN_BUCKETS[-1])}={count}"
+            for bucket, count in sorted(shard_counts.items(), key=lambda item: item[0] or float("inf"))))
+    
     print(f"✅ Final dataset: {len(unique_records)} unique question/response pairs")
     print(f"📁 Saved to: {output_file}")
     print(f"📊 Progress file: {progress_file}")
     print(f"📋 Format: {{question, response, metadata}}")
+    if dataset_index is not None:
+        # Keep the index in line with the records dropped above
+        if replaced_urls:
+            dataset_index.remove_source_urls(replaced_urls, before=run_started_at)
+        print(f"🔎 Query index: {index_file} ({len(dataset_index)} records)")
+        dataset_index.close()
 else:
     print(f"⚠️  No output file found. Collected {documents_collected} documents in memory.")
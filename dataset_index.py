@@ -0,0 +1,282 @@
+# Indexed query store over the produced dataset
+# Loads {question, response, metadata} records into SQLite with FTS5 over question/response
+# and indexed metadata columns, so subsets can be pulled without scanning the JSONL.
+#
+# Usage:
+#   python dataset_index.py build data/exports/dataset.jsonl
+#   python dataset_index.py query --brand lenovo --component battery --has-error-codes
+#   python dataset_index.py query --content-type procedure --min-quality 0.7 --limit 50 --json
+#   python dataset_index.py query "fan noise after bios update" --brand dell
+#
+# The builder updates the index incrementally as it saves records when BUILD_INDEX = True.
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+
+DEFAULT_INDEX_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data/exports/dataset.sqlite")
+BATCH_SIZE = 5000  # Records per transaction when building from a file
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    id INTEGER PRIMARY KEY,
+    digest TEXT UNIQUE NOT NULL,
+    question TEXT,
+    response TEXT,
+    source_url TEXT,
+    brand TEXT,
+    device_type TEXT,
+    component TEXT,
+    symptom TEXT,
+    difficulty_level TEXT,
+    content_type TEXT,
+    quality_score REAL,
+    has_error_codes INTEGER,
+    has_tools INTEGER,
+    extracted_at TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_records_brand_component ON records (brand, component);
+CREATE INDEX IF NOT EXISTS idx_records_device_type ON records (device_type);
+CREATE INDEX IF NOT EXISTS idx_records_content_type ON records (content_type);
+CREATE INDEX IF NOT EXISTS idx_records_quality ON records (quality_score);
+CREATE INDEX IF NOT EXISTS idx_records_source_url ON records (source_url);
+"""
+
+FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS records_fts USING fts5(
+    question, response, content='records', content_rowid='id'
+);
+CREATE TRIGGER IF NOT EXISTS records_fts_insert AFTER INSERT ON records BEGIN
+    INSERT INTO records_fts (rowid, question, response) VALUES (new.id, new.question, new.response);
+END;
+CREATE TRIGGER IF NOT EXISTS records_fts_delete AFTER DELETE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, question, response) VALUES ('delete', old.id, old.question, old.response);
+END;
+CREATE TRIGGER IF NOT EXISTS records_fts_update AFTER UPDATE ON records BEGIN
+    INSERT INTO records_fts (records_fts, rowid, question, response) VALUES ('delete', old.id, old.question, old.response);
+    INSERT INTO records_fts (rowid, question, response) VALUES (new.id, new.question, new.response);
+END;
+"""
+
+# Filter name -> SQL condition on the records table
+FILTERS = {
+    "brand": "r.brand = ?",
+    "device_type": "r.device_type = ?",
+    "component": "r.component = ?",
+    "symptom": "r.symptom = ?",
+    "difficulty_level": "r.difficulty_level = ?",
+    "content_type": "r.content_type = ?",
+    "source_url": "r.source_url = ?",
+    "min_quality": "r.quality_score >= ?",
+    "has_error_codes": "r.has_error_codes = ?",
+    "has_tools": "r.has_tools = ?",
+}
+
+COLUMNS = ("digest", "question", "response", "source_url", "brand", "device_type", "component", "symptom",
+           "difficulty_level", "content_type", "quality_score", "has_error_codes", "has_tools", "extracted_at", "metadata")
+
+# A record whose response is already indexed replaces the old row, so a recrawled page that produces the
+# same response again keeps its row (with the new extracted_at) when the old fetch's rows are removed
+UPSERT_SQL = (
+    f"INSERT INTO records ({', '.join(COLUMNS)}) VALUES ({', '.join('?' for _ in COLUMNS)}) "
+    f"ON CONFLICT(digest) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in COLUMNS[1:])}"
+)
+
+def remove_index(path):
+    """Delete an index database together with its WAL-mode -wal/-shm files"""
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+def fts_phrase_query(text):
+    """Plain text as an FTS5 query: every word quoted, so "can't boot" is not a syntax error"""
+    return " ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+def record_digest(response):
+    """Dedup key: same response prefix the builder's final deduplication uses"""
+    return hashlib.blake2b(response[:5000].encode("utf-8"), digest_size=16).hexdigest()
+
+def record_row(record):
+    """Column values for one record (older {input, output} records are accepted)"""
+    metadata = record.get("metadata")
+    if not isinstance(metadata, dict):
+        metadata = {}
+    question = record.get("question") or record.get("input") or ""
+    response = record.get("response") or record.get("output") or ""
+    return (
+        record_digest(response),
+        question,
+        response,
+        metadata.get("source_url"),
+        metadata.get("brand"),
+        metadata.get("device_type"),
+        metadata.get("component"),
+        metadata.get("symptom"),
+        metadata.get("difficulty_level"),
+        metadata.get("content_type"),
+        metadata.get("quality_score"),
+        1 if metadata.get("error_codes") else 0,
+        1 if metadata.get("tools_required") else 0,
+        metadata.get("extracted_at"),
+        json.dumps(metadata, ensure_ascii=False),
+    )
+
+class DatasetIndex:
+    """SQLite index of dataset records with full-text search and metadata filters"""
+
+    def __init__(self, path=DEFAULT_INDEX_FILE):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # The builder adds records from its writer thread; calls are never concurrent
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        try:
+            self.conn.executescript(FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 - text queries fall back to LIKE
+            self.fts = False
+        self.conn.commit()
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+
+    def add_records(self, records):
+        """Insert records (a record with an already indexed response replaces that row); returns rows written"""
+        with self.conn:
+            cur = self.conn.executemany(UPSERT_SQL, [record_row(r) for r in records])
+        return max(cur.rowcount, 0)
+
+    def build(self, jsonl_path):
+        """Add every record of a JSONL dataset; returns rows written"""
+        added = 0
+        batch = []
+        with open(jsonl_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    batch.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue
+                if len(batch) >= BATCH_SIZE:
+                    added += self.add_records(batch)
+                    batch = []
+        if batch:
+            added += self.add_records(batch)
+        return added
+
+    def remove_source_urls(self, urls, before=None):
+        """Delete records from the given source URLs (optionally only those extracted before a timestamp)"""
+        removed = 0
+        with self.conn:
+            for url in urls:
+                if before:
+                    cur = self.conn.execute("DELETE FROM records WHERE source_url = ? AND extracted_at < ?", (url, before))
+                else:
+                    cur = self.conn.execute("DELETE FROM records WHERE source_url = ?", (url,))
+                removed += cur.rowcount
+        return removed
+
+    def query(self, text=None, limit=20, **filters):
+        """Records matching a full-text query and/or metadata filters, best matches first"""
+        conditions, params = [], []
+        for name, value in filters.items():
+            if value is None:
+                continue
+            if name not in FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            conditions.append(FILTERS[name])
+            params.append(int(value) if isinstance(value, bool) else value)
+
+        if text and self.fts:
+            sql = "SELECT r.question, r.response, r.metadata FROM records_fts JOIN records r ON r.id = records_fts.rowid"
+            conditions.insert(0, "records_fts MATCH ?")
+            params.insert(0, text)
+            order = "ORDER BY bm25(records_fts)"
+            try:
+                return self._run_query(sql, conditions, params, order, limit)
+            except sqlite3.OperationalError:
+                # Not valid FTS5 syntax (e.g. an apostrophe) - search the words as plain text
+                params[0] = fts_phrase_query(text)
+        else:
+            sql = "SELECT r.question, r.response, r.metadata FROM records r"
+            if text:
+                conditions.insert(0, "(r.question LIKE ? OR r.response LIKE ?)")
+                params[:0] = [f"%{text}%", f"%{text}%"]
+            order = "ORDER BY r.quality_score DESC"
+        return self._run_query(sql, conditions, params, order, limit)
+
+    def _run_query(self, sql, conditions, params, order, limit):
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += f" {order} LIMIT ?"
+        return [
+            {"question": question, "response": response, "metadata": json.loads(metadata or "{}")}
+            for question, response, metadata in self.conn.execute(sql, params + [limit])
+        ]
+
+    def close(self):
+        self.conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the SQLite index over the dataset")
+    parser.add_argument("--db", default=DEFAULT_INDEX_FILE, help="Index database path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Index a JSONL dataset (incremental; existing records are kept)")
+    build.add_argument("input", help="JSONL dataset")
+    build.add_argument("--rebuild", action="store_true", help="Delete the index first")
+
+    query = sub.add_parser("query", help="Query the index")
+    query.add_argument("text", nargs="?", help="Full-text query over question and response (FTS5 syntax)")
+    query.add_argument("--brand")
+    query.add_argument("--device-type")
+    query.add_argument("--component")
+    query.add_argument("--symptom")
+    query.add_argument("--difficulty-level")
+    query.add_argument("--content-type")
+    query.add_argument("--source-url")
+    query.add_argument("--min-quality", type=float)
+    query.add_argument("--has-error-codes", action="store_true", default=None)
+    query.add_argument("--has-tools", action="store_true", default=None)
+    query.add_argument("--limit", type=int, default=20)
+    query.add_argument("--json", action="store_true", help="Print matching records as JSONL")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        if args.rebuild:
+            remove_index(args.db)
+        index = DatasetIndex(args.db)
+        started = time.perf_counter()
+        added = index.build(args.input)
+        print(f"✅ Indexed {added} records in {time.perf_counter() - started:.1f}s ({len(index)} total)")
+        print(f"📁 Index: {args.db}")
+        index.close()
+        return 0
+
+    index = DatasetIndex(args.db)
+    filters = {name: getattr(args, name) for name in FILTERS}
+    started = time.perf_counter()
+    results = index.query(args.text, limit=args.limit, **filters)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    for record in results:
+        if args.json:
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            metadata = record["metadata"]
+            print(f"[{metadata.get('quality_score')}] {record['question']}")
+            print(f"    {metadata.get('source_url')}")
+    if not args.json:
+        print(f"\n🔎 {len(results)} records in {elapsed_ms:.1f} ms")
+    index.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
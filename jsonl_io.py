@@ -0,0 +1,28 @@
+# Shared helpers for the offline JSONL dataset tools (rescore_dataset.py, merge_datasets.py)
+import json
+import os
+
+try:
+    import orjson  # type: ignore
+    JSON_LOADS = orjson.loads
+    def JSON_DUMPS(obj):
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    JSON_LOADS = json.loads
+    def JSON_DUMPS(obj):
+        return json.dumps(obj, ensure_ascii=False)
+
+def find_chunk_bounds(path, parts):
+    """Split a file into byte ranges that start and end on line boundaries"""
+    size = os.path.getsize(path)
+    bounds = [0]
+    with open(path, "rb") as f:
+        for i in range(1, parts):
+            f.seek(max(size * i // parts, bounds[-1]))
+            f.readline()
+            pos = min(f.tell(), size)
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
@@ -0,0 +1,170 @@
+# Merge and deduplicate many dataset.jsonl files (several machines / crawl dates)
+# Records are hash-partitioned by response digest into on-disk buckets, each bucket is
+# deduplicated in a worker process (highest quality_score wins), and every bucket becomes
+# one merged shard. Bucket count is derived from the input size, so peak memory stays
+# around --bucket-mb per worker no matter how large the inputs are.
+#
+# Usage:
+#   python merge_datasets.py machine-a/dataset.jsonl machine-b/dataset.jsonl -o data/exports/merged
+#   python merge_datasets.py runs/*/dataset.jsonl -o merged --workers 8 --bucket-mb 32
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+from dataset_index import record_digest
+from jsonl_io import JSON_LOADS, find_chunk_bounds
+
+DEFAULT_BUCKET_MB = 64  # Target on-disk size of one bucket (roughly what a worker holds in memory)
+RANGE_MB = 256  # Input is split into byte ranges of about this size for partitioning
+PARTITION_BUFFER_MB = 32  # Lines buffered per partitioning worker before they are appended to bucket files
+
+def find_ranges(path, range_bytes):
+    """(path, start, end) byte ranges of about range_bytes, on line boundaries"""
+    parts = max(1, -(-os.path.getsize(path) // range_bytes))
+    return [(path, start, end) for start, end in find_chunk_bounds(path, parts)]
+
+class BucketBuffer:
+    """Per-bucket line buffers appended to their bucket files in blocks
+    
+    No file stays open between flushes, so the bucket count is not limited by the
+    open-file limit (ulimit -n); memory is bounded by the flush threshold.
+    """
+    
+    def __init__(self, part_dir, task_id, max_bytes):
+        self.part_dir = part_dir
+        self.name = f"r{task_id:05d}"
+        self.max_bytes = max_bytes
+        self.buffers = {}  # bucket -> [bytes]
+        self.size = 0
+    
+    def write(self, bucket, data):
+        self.buffers.setdefault(bucket, []).append(data)
+        self.size += len(data)
+        if self.size >= self.max_bytes:
+            self.flush()
+    
+    def flush(self):
+        for bucket, chunks in self.buffers.items():
+            bucket_dir = os.path.join(self.part_dir, f"b{bucket:05d}")
+            os.makedirs(bucket_dir, exist_ok=True)
+            with open(os.path.join(bucket_dir, self.name), "ab") as f:
+                f.write(b"".join(chunks))
+        self.buffers.clear()
+        self.size = 0
+
+def record_score(record):
+    """quality_score used to resolve conflicts (records without one lose)"""
+    metadata = record.get("metadata")
+    score = metadata.get("quality_score") if isinstance(metadata, dict) else None
+    return float(score) if isinstance(score, (int, float)) else float("-inf")
+
+def partition_range(task):
+    """Worker: route each record of one byte range to its bucket file as 'digest<TAB>score<TAB>json'"""
+    path, start, end, buckets, part_dir, task_id = task
+    stats = {"read": 0, "malformed": 0}
+    out = BucketBuffer(part_dir, task_id, PARTITION_BUFFER_MB << 20)
+    with open(path, "rb") as f:
+        f.seek(start)
+        while f.tell() < end:
+            line = f.readline()
+            if not line:
+                break
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = JSON_LOADS(line)
+                response = record.get("response") or record.get("output") or ""
+            except (ValueError, AttributeError):
+                stats["malformed"] += 1
+                continue
+            if not response:
+                stats["malformed"] += 1
+                continue
+            stats["read"] += 1
+            digest = record_digest(response)
+            bucket = int(digest[:8], 16) % buckets
+            out.write(bucket, f"{digest}\t{record_score(record)!r}\t".encode("ascii") + line + b"\n")
+    out.flush()
+    return stats
+
+def dedupe_bucket(task):
+    """Worker: keep the highest-scoring record per digest in one bucket and write it as a shard"""
+    bucket_dir, shard_path = task
+    best = {}
+    conflicts = 0
+    # Range files are read in input order, so ties keep the earliest record
+    for name in sorted(os.listdir(bucket_dir)):
+        with open(os.path.join(bucket_dir, name), "rb") as f:
+            for line in f:
+                digest, score, record = line.split(b"\t", 2)
+                score = float(score)
+                kept = best.get(digest)
+                if kept is None:
+                    best[digest] = (score, record)
+                else:
+                    conflicts += 1
+                    if score > kept[0]:
+                        best[digest] = (score, record)
+    with open(shard_path, "wb") as out:
+        for _, record in best.values():
+            out.write(record)
+    shutil.rmtree(bucket_dir)
+    return {"unique": len(best), "duplicates": conflicts}
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge and deduplicate dataset JSONL files into shards")
+    parser.add_argument("inputs", nargs="+", help="Input JSONL datasets")
+    parser.add_argument("-o", "--output", required=True, help="Output directory for merged shards")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--bucket-mb", type=float, default=DEFAULT_BUCKET_MB, help="Target bucket size in MB")
+    parser.add_argument("--tmp-dir", help="Directory for bucket files (default: inside the output directory)")
+    args = parser.parse_args()
+
+    missing = [path for path in args.inputs if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"input not found: {', '.join(missing)}")
+    os.makedirs(args.output, exist_ok=True)
+    for name in os.listdir(args.output):
+        if name.startswith("merged-") and name.endswith(".jsonl"):
+            os.remove(os.path.join(args.output, name))
+
+    total_bytes = sum(os.path.getsize(path) for path in args.inputs)
+    buckets = max(1, -(-total_bytes // int(args.bucket_mb * (1 << 20))))
+    ranges = [r for path in args.inputs for r in find_ranges(path, RANGE_MB << 20)]
+    part_dir = tempfile.mkdtemp(prefix="merge-", dir=args.tmp_dir or args.output)
+    started = time.perf_counter()
+
+    print(f"🔀 Merging {len(args.inputs)} files ({total_bytes / (1 << 20):.0f} MB) into {buckets} buckets "
+          f"on {args.workers} workers...")
+    try:
+        totals = {"read": 0, "malformed": 0, "unique": 0, "duplicates": 0}
+        tasks = [(path, start, end, buckets, part_dir, i) for i, (path, start, end) in enumerate(ranges)]
+        with Pool(args.workers) as pool:
+            for stats in pool.imap_unordered(partition_range, tasks):
+                for key, value in stats.items():
+                    totals[key] += value
+            print(f"📦 Partitioned {totals['read']} records in {time.perf_counter() - started:.1f}s")
+
+            shard_tasks = [
+                (os.path.join(part_dir, name), os.path.join(args.output, f"merged-{name[1:]}.jsonl"))
+                for name in sorted(os.listdir(part_dir))
+            ]
+            for stats in pool.imap_unordered(dedupe_bucket, shard_tasks):
+                for key, value in stats.items():
+                    totals[key] += value
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    print(f"✅ Read {totals['read']} records, kept {totals['unique']} unique "
+          f"({totals['duplicates']} duplicates dropped) in {time.perf_counter() - started:.1f}s")
+    if totals["malformed"]:
+        print(f"⚠️  Skipped {totals['malformed']} malformed or empty records")
+    print(f"📁 Shards: {args.output} ({len(shard_tasks)} files)")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,244 @@
+# Batch re-scoring and filtering tool for existing datasets
+# Recomputes quality_score from record metadata with configurable weights, without recrawling.
+#
+# Usage:
+#   python rescore_dataset.py data/exports/dataset.jsonl -o data/exports/dataset.rescored.jsonl
+#   python rescore_dataset.py dataset.jsonl -o out.jsonl --min-score 0.5 --weight error_codes=2 --weight symptom=0.5
+#   python rescore_dataset.py dataset.jsonl --stats-only
+#
+# Records carry the page-level scoring inputs in metadata["quality_features"]. Older records
+# without them keep their stored quality_score unless --infer-missing is given.
+import argparse
+import json
+import os
+import sys
+import tempfile
+from multiprocessing import Pool
+
+import numpy as np
+
+from jsonl_io import JSON_DUMPS, JSON_LOADS, find_chunk_bounds
+
+# Feature columns, named as in metadata["quality_features"]. With those stored, the default
+# weights reproduce calculate_quality_score in binaryheart_dataset_builder1.1.py (max score 10,
+# normalized to 0-1). --infer-missing approximates them for older records from the fields the
+# record kept (response length for text length, content type / estimated time for procedure);
+# that underscores records whose content type drops fields such as error codes.
+FEATURES = [
+    "text_length",        # 0, 0.5, 0.75 or 1.0 for <100, >=100, >=200, >=500 chars
+    "device_type",
+    "component",
+    "symptom",
+    "procedure",
+    "tools_required",
+    "safety_warnings",
+    "error_codes",
+    "difficulty_level",
+    "tool_count",         # Raw counts, unweighted by default
+    "safety_count",
+    "error_code_count",
+]
+
+DEFAULT_WEIGHTS = {
+    "text_length": 2.0,
+    "device_type": 1.0,
+    "component": 1.0,
+    "symptom": 1.0,
+    "procedure": 1.0,
+    "tools_required": 1.0,
+    "safety_warnings": 1.0,
+    "error_codes": 1.0,
+    "difficulty_level": 1.0,
+    "tool_count": 0.0,
+    "safety_count": 0.0,
+    "error_code_count": 0.0,
+}
+
+DEFAULT_MIN_SCORE = 0.3  # Same cutoff as generate_question_response_pairs
+CHUNK_ROWS = 50000  # Records scored per vectorized batch inside a worker
+
+def text_length_tier(length):
+    """Crawl-time text length tiers as a fraction of the text_length weight"""
+    if length >= 500:
+        return 1.0
+    if length >= 200:
+        return 0.75
+    if length >= 100:
+        return 0.5
+    return 0.0
+
+def stored_score(metadata):
+    score = metadata.get("quality_score")
+    return float(score) if isinstance(score, (int, float)) else float("nan")
+
+def record_features(record):
+    """(feature row, stored score, exact) for one record; exact means the crawl-time features were stored"""
+    metadata = record.get("metadata")
+    if not isinstance(metadata, dict):
+        metadata = {}
+    stored = metadata.get("quality_features")
+    if isinstance(stored, dict):
+        row = [float(stored.get(name) or 0) for name in FEATURES]
+        row[0] = text_length_tier(row[0])
+        return row, stored_score(metadata), True
+    return inferred_features(record, metadata), stored_score(metadata), False
+
+def inferred_features(record, metadata):
+    """Approximate feature row for records saved without quality_features (missing metadata counts as absent)"""
+    response = record.get("response") or record.get("output") or ""
+    tools = metadata.get("tools_required") or []
+    safety = metadata.get("safety_warnings") or []
+    errors = metadata.get("error_codes") or []
+    has_procedure = metadata.get("content_type") in ("procedure", "tools_guide") or bool(metadata.get("estimated_time"))
+    return (
+        text_length_tier(len(response)),
+        1.0 if metadata.get("device_type") else 0.0,
+        1.0 if metadata.get("component") else 0.0,
+        1.0 if metadata.get("symptom") else 0.0,
+        1.0 if has_procedure else 0.0,
+        1.0 if tools else 0.0,
+        1.0 if safety else 0.0,
+        1.0 if errors else 0.0,
+        1.0 if metadata.get("difficulty_level") else 0.0,
+        float(len(tools)),
+        float(len(safety)),
+        float(len(errors)),
+    )
+
+def score_matrix(features, weights):
+    """Vectorized quality scores: weighted sum normalized by the positive weight total"""
+    max_score = weights[weights > 0].sum() or 1.0
+    return np.clip(features @ weights / max_score, 0.0, 1.0)
+
+def score_range(task):
+    """Worker: score records in one byte range, writing kept records to a part file"""
+    path, start, end, weights, min_score, rewrite, infer_missing, part_path = task
+    weights = np.asarray(weights, dtype=np.float64)
+    stats = {"read": 0, "kept": 0, "malformed": 0, "stored": 0, "histogram": np.zeros(10, dtype=np.int64)}
+
+    def flush(batch, rows, out):
+        if not batch:
+            return
+        features, stored, exact = zip(*rows)
+        scores = score_matrix(np.asarray(features, dtype=np.float64), weights)
+        if not infer_missing:
+            # Records without stored features keep their crawl-time score
+            stored = np.asarray(stored, dtype=np.float64)
+            use_stored = ~np.asarray(exact) & ~np.isnan(stored)
+            scores = np.where(use_stored, stored, scores)
+            stats["stored"] += int(use_stored.sum())
+        keep = scores >= min_score
+        stats["histogram"] += np.histogram(scores, bins=10, range=(0.0, 1.0))[0]
+        stats["kept"] += int(keep.sum())
+        if out is None:
+            return
+        for record, score, kept in zip(batch, scores.tolist(), keep.tolist()):
+            if not kept:
+                continue
+            if rewrite and isinstance(record.get("metadata"), dict):
+                record["metadata"]["quality_score"] = round(score, 2)
+            out.write(JSON_DUMPS(record) + "\n")
+
+    out = open(part_path, "w", encoding="utf-8") if part_path else None
+    try:
+        with open(path, "rb") as f:
+            f.seek(start)
+            batch, rows = [], []
+            while f.tell() < end:
+                line = f.readline()
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                try:
+                    record = JSON_LOADS(line)
+                except ValueError:
+                    stats["malformed"] += 1
+                    continue
+                if not isinstance(record, dict):
+                    stats["malformed"] += 1  # Valid JSON but not a record object
+                    continue
+                stats["read"] += 1
+                batch.append(record)
+                rows.append(record_features(record))
+                if len(batch) >= CHUNK_ROWS:
+                    flush(batch, rows, out)
+                    batch, rows = [], []
+            flush(batch, rows, out)
+    finally:
+        if out:
+            out.close()
+    return stats
+
+def parse_weights(args):
+    """Merge default weights with a JSON weights file and --weight overrides"""
+    weights = dict(DEFAULT_WEIGHTS)
+    if args.weights:
+        with open(args.weights, "r", encoding="utf-8") as f:
+            weights.update(json.load(f))
+    for item in args.weight or []:
+        name, _, value = item.partition("=")
+        weights[name.strip()] = float(value)
+    unknown = set(weights) - set(FEATURES)
+    if unknown:
+        raise SystemExit(f"❌ Unknown feature(s): {', '.join(sorted(unknown))}. Known: {', '.join(FEATURES)}")
+    return [weights[name] for name in FEATURES]
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score and filter an existing dataset with configurable weights")
+    parser.add_argument("input", help="Input JSONL dataset")
+    parser.add_argument("-o", "--output", help="Output JSONL file (required unless --stats-only)")
+    parser.add_argument("--weights", help="JSON file mapping feature name -> weight")
+    parser.add_argument("--weight", action="append", metavar="NAME=VALUE", help="Override one feature weight")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE, help="Drop records scoring below this")
+    parser.add_argument("--keep-scores", action="store_true", help="Filter only, keep the stored quality_score")
+    parser.add_argument("--infer-missing", action="store_true",
+                        help="Re-score records without stored quality_features from approximate features")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--stats-only", action="store_true", help="Print the score distribution without writing output")
+    args = parser.parse_args()
+
+    if not args.output and not args.stats_only:
+        parser.error("--output is required unless --stats-only is given")
+    weights = parse_weights(args)
+
+    ranges = find_chunk_bounds(args.input, max(1, args.workers * 4))
+    part_dir = None if args.stats_only else tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(args.output)))
+    tasks = []
+    for i, (start, end) in enumerate(ranges):
+        part_path = os.path.join(part_dir, f"part-{i:05d}.jsonl") if part_dir else None
+        tasks.append((args.input, start, end, weights, args.min_score, not args.keep_scores, args.infer_missing, part_path))
+
+    print(f"🔢 Scoring {args.input} in {len(tasks)} chunks on {args.workers} workers...")
+    totals = {"read": 0, "kept": 0, "malformed": 0, "stored": 0, "histogram": np.zeros(10, dtype=np.int64)}
+    with Pool(args.workers) as pool:
+        for stats in pool.imap(score_range, tasks):
+            for key in totals:
+                totals[key] = totals[key] + stats[key]
+
+    # Concatenate part files in input order
+    if part_dir:
+        with open(args.output, "wb") as out:
+            for task in tasks:
+                with open(task[-1], "rb") as part:
+                    while True:
+                        block = part.read(1 << 20)
+                        if not block:
+                            break
+                        out.write(block)
+                os.remove(task[-1])
+        os.rmdir(part_dir)
+
+    print(f"✅ Read {totals['read']} records, kept {totals['kept']} (min score {args.min_score})")
+    if totals["stored"]:
+        print(f"ℹ️  {totals['stored']} records without quality_features kept their stored score (see --infer-missing)")
+    if totals["malformed"]:
+        print(f"⚠️  Skipped {totals['malformed']} malformed lines")
+    print("📊 Score distribution:")
+    for i, count in enumerate(totals["histogram"].tolist()):
+        print(f"   {i / 10:.1f}-{(i + 1) / 10:.1f}: {count}")
+    if args.output and not args.stats_only:
+        print(f"📁 Saved to: {args.output}")
+
+if __name__ == "__main__":
+    sys.exit(main())